@@ -1,29 +1,151 @@
 import xxhash
+import numpy as np
+from itertools import repeat, islice
 import subprocess
 import os
 import sys
+import mmap
+import re
+import argparse
+from multiprocessing import Pool, shared_memory
+from collections import Counter, OrderedDict
+from functools import lru_cache, partial
+
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
 
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
+
+class HashCache(object):
+    """
+    Bounded memo of HashXX32 results keyed by (seed, token). The raw hash
+    does not depend on the table size, so one cache can be shared by every
+    hasher of a sweep over seeds, table sizes and repeated trials.
+
+    The entries of one seed form a column, a functools.lru_cache keyed by
+    the token alone, so a hit is a single C-level dict lookup instead of a
+    (seed, token) tuple lookup that costs about as much as xxhash itself.
+    Eviction works on whole columns: opening a new seed while more than
+    `capacity` entries are held drops the least recently used seeds first.
+    """
+    def __init__(self, capacity):
+        """
+        Description of attributes:
+            capacity - number of (seed, token) entries above which the
+                       least recently used seeds are evicted
+            columns - seed -> memoized hash function of that seed, in
+                      least to most recently used order
+            size - number of (seed, token) entries held
+            misses - number of lookups that had to call xxhash
+        """
+        self.capacity = capacity
+        self.columns = OrderedDict()
+        self.size = 0
+        self.misses = 0
+        self.evicted_hits = 0
+
+    def column(self, seed):
+        '''Return the memoized hash function of `seed`, opening it if needed.'''
+        column = self.columns.get(seed)
+        if column is not None:
+            self.columns.move_to_end(seed)
+            return column
+        while self.columns and self.size >= self.capacity:
+            _, evicted = self.columns.popitem(last=False)
+            info = evicted.cache_info()
+            self.size -= info.currsize
+            self.evicted_hits += info.hits
+        column = self.columns[seed] = lru_cache(maxsize=None)(partial(self._miss, seed))
+        return column
+
+    def _miss(self, seed, o):
+        self.misses += 1
+        self.size += 1
+        return xxhash.xxh32_intdigest(o, seed) % sys.maxsize
+
+    @property
+    def hits(self):
+        '''Number of lookups answered from the cache.'''
+        return self.evicted_hits + sum(column.cache_info().hits for column in self.columns.values())
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
 
 class HashXX32(object):
-    def __init__(self, seed):
+    def __init__(self, seed, cache=None):
+        self.seed = seed
+        self.cache = cache
         self.h = xxhash.xxh32(seed=seed)
+        if cache is not None:
+            self.hash = cache.column(seed)
 
     def hash(self, o):
         self.h.reset()
         self.h.update(o)
         return self.h.intdigest() % sys.maxsize
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
 class HashSetWithProbing(object):
-    def __init__(self, size, seed):
+    def __init__(self, size, seed, max_load_factor=None, cache=None):
         """
         Description of attributes:
             hasher - hash function you will use to insert elements
-                     into the table
+                     into the table. It looks hash values up in `cache`,
+                     an optional HashCache, before calling xxhash.
             size - number of buckets in the hash table
             table - the actual hash table
             n - number of distinct items in the hash table
+            max_load_factor - once inserting a new item would push n / size
+                              above this value, the table doubles in size and
+                              every item is rehashed. None keeps the size fixed.
             probing_steps - total number of probing steps taken while
                             inserting elements into the table. Each time
                             you have to increment the index according to the quadratic rule
@@ -32,16 +154,52 @@ class HashSetWithProbing(object):
                             probing steps even when the index according to the quadratic function
                             is invalid! Lastly, if you are trying to insert a duplicate item do not 
                             include any steps it took to get to that duplicate
-                            entry.
+                            entry. After a resize it is recounted for the rehashed
+                            table, so it always describes the current layout.
+            probe_lengths - Counter of the probing steps each item took to be inserted
         """
-        self.hasher = HashXX32(seed)
+        self.hasher = HashXX32(seed, cache)
         self.size = size
         self.m = 2 ** (self.size - 1).bit_length()
         # raise NotImplementedError()
         self.table = [None] * size
         self.n = 0
+        self.max_load_factor = max_load_factor
         self.probing_steps = 0
-           
+        self.probe_lengths = Counter()
+
+    def _probe(self, obj):
+        '''
+        Walk the quadratic probe sequence of `obj` and return (index, steps):
+        the bucket holding `obj`, or the first empty bucket on the sequence,
+        and the number of probing steps it took to get there. Since m is a
+        power of two, the first m steps visit every index below m exactly
+        once, so index is None only if the sequence holds neither.
+        '''
+        initial_index = self.hasher.hash(obj) % self.size
+        for i in range(self.m):
+            index = (initial_index + i * (i + 1) // 2) % self.m
+            # invalid indices still count as a probing step
+            if index < self.size:
+                bucket_value = self.table[index]
+                if (bucket_value is None) or (bucket_value == obj):
+                    return index, i
+        return None, self.m
+
+    def _resize(self, size):
+        '''
+        Rebuild the table with `size` buckets and reinsert every item.
+        '''
+        items = [obj for obj in self.table if obj is not None]
+        self.size = size
+        self.m = 2 ** (self.size - 1).bit_length()
+        self.table = [None] * size
+        self.n = 0
+        self.probing_steps = 0
+        self.probe_lengths = Counter()
+        for obj in items:
+            self.insert(obj)
+
     def insert(self, obj):
         '''
         Insert the object into the hash set. If the initial bucket
@@ -59,25 +217,23 @@ class HashSetWithProbing(object):
         Return True if you could insert the element or it already exists
         in the table, and return False if you cannot
         '''
-        initial_index = self.hasher.hash(obj) % self.size
-        i = 0
-
-        insertion = False if not self.__contains__(obj) else True
-
-        # begin inserting iff obj is not in the table and the table has empty slot
-        # otherwise insertaion would be failed
-        while (not insertion) & (None in self.table):
-            new_index = round((initial_index + 1/2*i + 1/2*(i**2)) % self.m)
-            # invalid index or the bucket has been occupied
-            if (new_index >= self.size) or (self.table[new_index] is not None):
-                i += 1
-            else:
-                self.table[new_index] = obj
-                self.n += 1
-                insertion = True
-        
+        index, i = self._probe(obj)
+        if (index is not None) and (self.table[index] is not None):
+            # duplicate: its probing steps are not counted
+            return True
+
+        if (self.max_load_factor is not None) and (self.n + 1 > self.max_load_factor * self.size):
+            self._resize(2 * self.size)
+            index, i = self._probe(obj)
+
+        if index is None:
+            return False
+
+        self.table[index] = obj
+        self.n += 1
         self.probing_steps += i
-        return insertion
+        self.probe_lengths[i] += 1
+        return True
 
         # raise NotImplementedError()
     
@@ -86,7 +242,8 @@ class HashSetWithProbing(object):
         Return True if the object has been added 
         and False if it has not been.
         '''
-        return obj in self.table
+        index, _ = self._probe(obj)
+        return (index is not None) and (self.table[index] is not None)
         # raise NotImplementedError()
     
     def avg_probing_steps(self):
@@ -97,28 +254,221 @@ class HashSetWithProbing(object):
         # total number of probing steps / number of distinct items
         return self.probing_steps / self.n
         # raise NotImplementedError()
+
+    def probe_length_histogram(self):
+        '''
+        Return {probing steps: number of items inserted with that many steps}.
+        '''
+        return dict(sorted(self.probe_lengths.items()))
+
+    def displacement_histogram(self):
+        '''
+        Return {times moved: number of inserts}. Quadratic probing never
+        moves an item once it is placed.
+        '''
+        return {0: self.n} if self.n else {}
         
+class CompactHashSetWithProbing(object):
+    """
+    Open-addressing hash set with the same quadratic probing rule as
+    HashSetWithProbing, but without a Python object per bucket: buckets
+    are NumPy arrays and the keys are interned as UTF-8 bytes in one
+    contiguous arena.
+    """
+    def __init__(self, size, seed, cache=None):
+        """
+        Description of attributes:
+            hasher - hash function you will use to insert elements
+                     into the table. It looks hash values up in `cache`,
+                     an optional HashCache, before calling xxhash.
+            size - number of buckets in the hash table
+            n - number of distinct items in the hash table
+            probing_steps - total number of probing steps taken while
+                            inserting elements, counted exactly as in
+                            HashSetWithProbing
+            probe_lengths - Counter of the probing steps each item took to be inserted
+            slots - for each bucket, the position of its key in the arena,
+                    or -1 if the bucket is empty
+            hashes - for each bucket, the full hash value of its key, so
+                     most mismatches are rejected without touching the arena
+            arena - the UTF-8 bytes of every key, back to back
+            offsets - key i occupies arena[offsets[i]:offsets[i + 1]]
+        """
+        self.hasher = HashXX32(seed, cache)
+        self.size = size
+        self.m = 2 ** (self.size - 1).bit_length()
+        self.n = 0
+        self.probing_steps = 0
+        self.probe_lengths = Counter()
+        self.slots = np.full(size, -1, dtype=np.int32)
+        self.hashes = np.zeros(size, dtype=np.uint32)
+        self.arena = bytearray()
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+
+    def _probe(self, key):
+        '''
+        Walk the quadratic probe sequence of `key` and return
+        (index, steps, hash_val): the bucket holding `key` or the first
+        empty bucket on the sequence (None if there is neither), the number
+        of probing steps it took, and the hash value of `key`.
+        '''
+        hash_val = self.hasher.hash(key)
+        initial_index = hash_val % self.size
+        for i in range(self.m):
+            index = (initial_index + i * (i + 1) // 2) % self.m
+            if index < self.size:
+                slot = self.slots[index]
+                if slot < 0:
+                    return index, i, hash_val
+                if self.hashes[index] == hash_val and \
+                        self.arena[self.offsets[slot]:self.offsets[slot + 1]] == key:
+                    return index, i, hash_val
+        return None, self.m, hash_val
+
+    def insert(self, obj):
+        '''
+        Insert the object into the hash set, probing like
+        HashSetWithProbing.insert.
+
+        Return True if you could insert the element or it already exists
+        in the table, and return False if you cannot
+        '''
+        key = obj.encode("utf8") if isinstance(obj, str) else bytes(obj)
+        index, i, hash_val = self._probe(key)
+        if index is None:
+            return False
+        if self.slots[index] >= 0:
+            return True
+
+        self.arena += key
+        self.offsets[self.n + 1] = len(self.arena)
+        self.slots[index] = self.n
+        self.hashes[index] = hash_val
+        self.n += 1
+        self.probing_steps += i
+        self.probe_lengths[i] += 1
+        return True
+
+    def __contains__(self, obj):
+        '''
+        Return True if the object has been added 
+        and False if it has not been.
+        '''
+        key = obj.encode("utf8") if isinstance(obj, str) else bytes(obj)
+        index, _, _ = self._probe(key)
+        return (index is not None) and (self.slots[index] >= 0)
+
+    def avg_probing_steps(self):
+        '''
+        Returns the average number of steps needed to insert an 
+        element into the table
+        '''
+        return self.probing_steps / self.n
+
+    def probe_length_histogram(self):
+        '''
+        Return {probing steps: number of items inserted with that many steps}.
+        '''
+        return dict(sorted(self.probe_lengths.items()))
+
+    def displacement_histogram(self):
+        '''
+        Return {times moved: number of inserts}. Quadratic probing never
+        moves an item once it is placed.
+        '''
+        return {0: self.n} if self.n else {}
+
+    def memory_bytes(self):
+        '''
+        Return the number of bytes held by the table arrays and the key arena.
+        '''
+        return self.slots.nbytes + self.hashes.nbytes + self.offsets.nbytes + len(self.arena)
+
+    def bytes_per_element(self):
+        '''
+        Return the memory footprint divided by the number of distinct items.
+        '''
+        return self.memory_bytes() / self.n
+
 class HashSetWithChaining(object):
-    def __init__(self, size, seed):
+    def __init__(self, size, seed, max_avg_chain_length=None, rehash_step=4, cache=None):
         """
         Description of attributes:
             hasher - hash function you will use to insert elements
-                     into the table
+                     into the table. It looks hash values up in `cache`,
+                     an optional HashCache, before calling xxhash.
             size - number of buckets in the hash table
             table - the actual hash table 
+            n - number of distinct items in the hash set
+            max_avg_chain_length - once n / size goes above this value the set
+                                   starts moving its items into a table twice
+                                   as large. None keeps the size fixed.
+            rehash_step - number of old buckets moved into the new table on
+                          each insert while a resize is in progress
         """
-        self.hasher = HashXX32(seed)
+        self.hasher = HashXX32(seed, cache)
         self.size = size
         # raise NotImplementedError()
         self.table = table = [[] for i in range(size)]
-    
+        self.n = 0
+        self.max_avg_chain_length = max_avg_chain_length
+        self.rehash_step = rehash_step
+        # buckets of the previous table that have not been moved yet are
+        # old_table[rehash_index:]; old_table is None when no resize is running
+        self.old_table = None
+        self.rehash_index = 0
+        self._max_num_in_bucket = 0
+
+    def _bucket(self, obj):
+        '''
+        Return the bucket `obj` lives in, or would be appended to if it
+        has not been inserted yet, and whether that bucket belongs to the
+        current table rather than the old one.
+        '''
+        hash_val = self.hasher.hash(obj)
+        if self.old_table is not None:
+            old_index = hash_val % len(self.old_table)
+            if old_index >= self.rehash_index:
+                return self.old_table[old_index], False
+        return self.table[hash_val % self.size], True
+
+    def _rehash(self, num_buckets):
+        '''
+        Move up to `num_buckets` buckets of the old table into the new one.
+        '''
+        stop = min(self.rehash_index + num_buckets, len(self.old_table))
+        for index in range(self.rehash_index, stop):
+            for obj in self.old_table[index]:
+                bucket = self.table[self.hasher.hash(obj) % self.size]
+                bucket.append(obj)
+                self._max_num_in_bucket = max(self._max_num_in_bucket, len(bucket))
+            self.old_table[index] = None
+        self.rehash_index = stop
+        if self.rehash_index == len(self.old_table):
+            self.old_table = None
+            self.rehash_index = 0
+
     def insert(self, obj):
         '''
         Insert the object into the hash set.
         '''
-        index = self.hasher.hash(obj) % self.size
-        if not self.__contains__(obj):
-            self.table[index].append(obj)
+        bucket, in_table = self._bucket(obj)
+        if obj in bucket:
+            return
+        # a bucket still waiting in the old table keeps its new items
+        # there, they are moved together with the rest of it
+        bucket.append(obj)
+        self.n += 1
+        if in_table:
+            self._max_num_in_bucket = max(self._max_num_in_bucket, len(bucket))
+
+        if self.old_table is not None:
+            self._rehash(self.rehash_step)
+        elif (self.max_avg_chain_length is not None) and (self.n / self.size > self.max_avg_chain_length):
+            self.old_table = self.table
+            self.size *= 2
+            self.table = [[] for i in range(self.size)]
+            self._max_num_in_bucket = 0
         # raise NotImplementedError()
             
     def __contains__(self, obj):
@@ -126,7 +476,7 @@ class HashSetWithChaining(object):
         Return True if the object has been added 
         and False if it has not been.
         '''
-        return any(obj in bucket for bucket in self.table)
+        return obj in self._bucket(obj)[0]
         # raise NotImplementedError()
 
     def max_num_in_bucket(self):
@@ -134,38 +484,411 @@ class HashSetWithChaining(object):
         Return the maximum number of items in a given hash bucket
         for the hash set.
         '''
-        return max(len(bucket) for bucket in self.table)
+        # finish a running resize so the count is exact for the current table
+        if self.old_table is not None:
+            self._rehash(len(self.old_table))
+        return self._max_num_in_bucket
         # raise NotImplementedError()
 
+    def probe_length_histogram(self):
+        '''
+        Return {items passed over: number of items}, i.e. how many items
+        precede each item in its chain.
+        '''
+        if self.old_table is not None:
+            self._rehash(len(self.old_table))
+        lengths = Counter()
+        for bucket in self.table:
+            for position in range(len(bucket)):
+                lengths[position] += 1
+        return dict(sorted(lengths.items()))
+
+    def displacement_histogram(self):
+        '''
+        Return {times moved: number of inserts}. Appending to a chain
+        never displaces an item already in the table.
+        '''
+        return {0: self.n} if self.n else {}
+
+class HashSetWithRobinHood(object):
+    """
+    Linear probing where an item being inserted takes the bucket of any
+    item that sits closer to its own home bucket, which keeps the spread
+    of probe lengths small at high load factors.
+    """
+    def __init__(self, size, seed, cache=None):
+        """
+        Description of attributes:
+            hasher - hash function you will use to insert elements
+                     into the table. It looks hash values up in `cache`,
+                     an optional HashCache, before calling xxhash.
+            size - number of buckets in the hash table
+            table - the actual hash table
+            distances - for each bucket, how far its item sits from the
+                        bucket it hashes to
+            n - number of distinct items in the hash table
+            displacements - Counter of how many items each insert moved
+        """
+        self.hasher = HashXX32(seed, cache)
+        self.size = size
+        self.table = [None] * size
+        self.distances = [0] * size
+        self.n = 0
+        self.displacements = Counter()
+
+    def insert(self, obj):
+        '''
+        Insert the object into the hash set, swapping it with any item it
+        meets that is closer to its home bucket than obj is to its own.
+
+        Return True if you could insert the element or it already exists
+        in the table, and return False if the table is full.
+        '''
+        if self.__contains__(obj):
+            return True
+        if self.n == self.size:
+            return False
+
+        index = self.hasher.hash(obj) % self.size
+        distance = 0
+        moved = 0
+        while self.table[index] is not None:
+            if self.distances[index] < distance:
+                obj, self.table[index] = self.table[index], obj
+                distance, self.distances[index] = self.distances[index], distance
+                moved += 1
+            index = (index + 1) % self.size
+            distance += 1
+        self.table[index] = obj
+        self.distances[index] = distance
+        self.n += 1
+        self.displacements[moved] += 1
+        return True
+
+    def __contains__(self, obj):
+        '''
+        Return True if the object has been added 
+        and False if it has not been.
+        '''
+        index = self.hasher.hash(obj) % self.size
+        for distance in range(self.size):
+            bucket_value = self.table[index]
+            # obj would have displaced any item closer to its home bucket
+            if (bucket_value is None) or (self.distances[index] < distance):
+                return False
+            if bucket_value == obj:
+                return True
+            index = (index + 1) % self.size
+        return False
+
+    def avg_probing_steps(self):
+        '''
+        Returns the average distance between an item and its home bucket,
+        i.e. the probing steps a lookup of the item takes.
+        '''
+        return sum(self.distances) / self.n
+
+    def probe_length_histogram(self):
+        '''
+        Return {probing steps: number of items that far from their home bucket}.
+        '''
+        lengths = Counter(self.distances[index] for index in range(self.size)
+                          if self.table[index] is not None)
+        return dict(sorted(lengths.items()))
+
+    def displacement_histogram(self):
+        '''
+        Return {items moved: number of inserts that moved that many items}.
+        '''
+        return dict(sorted(self.displacements.items()))
+
+class HashSetWithCuckoo(object):
+    """
+    2-way cuckoo hashing: every item lives in one of the two buckets given
+    by its two hash functions, so a lookup checks at most two buckets.
+    """
+    def __init__(self, size, seed, max_kicks=100, grow=True, cache=None):
+        """
+        Description of attributes:
+            hashers - the two hash functions; the second one is seeded with
+                      the bitwise complement of seed so the two never match.
+                      Both look hash values up in `cache`, an optional
+                      HashCache, before calling xxhash.
+            size - number of buckets in the hash table
+            table - the actual hash table
+            n - number of distinct items in the hash table
+            max_kicks - number of evictions an insert may cause before it
+                        gives up
+            grow - when an insert gives up, double the table and rehash
+                   every item if True; otherwise undo its evictions and
+                   reject the item, so the table keeps its size
+            num_rehashes - number of times the table had to be rebuilt
+            num_failures - number of inserts rejected with grow=False
+            displacements - Counter of how many evictions each insert caused.
+                            It is recounted after a rebuild, like probing_steps
+                            in HashSetWithProbing.
+        """
+        self.hashers = [HashXX32(seed, cache), HashXX32(~seed & 0xFFFFFFFF, cache)]
+        self.size = size
+        self.table = [None] * size
+        self.n = 0
+        self.max_kicks = max_kicks
+        self.grow = grow
+        self.num_rehashes = 0
+        self.num_failures = 0
+        self.displacements = Counter()
+
+    def _indices(self, obj):
+        return [hasher.hash(obj) % self.size for hasher in self.hashers]
+
+    def _rebuild(self, pending):
+        '''
+        Double the table and reinsert every item plus `pending`, which was
+        left homeless by a failed insert.
+        '''
+        items = [obj for obj in self.table if obj is not None] + [pending]
+        self.size *= 2
+        self.table = [None] * self.size
+        self.n = 0
+        self.displacements = Counter()
+        self.num_rehashes += 1
+        for obj in items:
+            self.insert(obj)
+
+    def insert(self, obj):
+        '''
+        Insert the object into one of its two buckets, evicting the current
+        occupant to its other bucket when both are taken.
+
+        If max_kicks evictions are not enough, the table is doubled and
+        rebuilt, or with grow=False the evictions are undone and False is
+        returned. Otherwise returns True.
+        '''
+        if self.__contains__(obj):
+            return True
+
+        for index in self._indices(obj):
+            if self.table[index] is None:
+                self.table[index] = obj
+                self.n += 1
+                self.displacements[0] += 1
+                return True
+
+        index = self._indices(obj)[0]
+        path = []
+        for kicks in range(1, self.max_kicks + 1):
+            obj, self.table[index] = self.table[index], obj
+            path.append(index)
+            first, second = self._indices(obj)
+            index = second if index == first else first
+            if self.table[index] is None:
+                self.table[index] = obj
+                self.n += 1
+                self.displacements[kicks] += 1
+                return True
+
+        if self.grow:
+            self._rebuild(obj)
+            return True
+        # swap every evicted item back, which leaves the rejected one in obj
+        for index in reversed(path):
+            obj, self.table[index] = self.table[index], obj
+        self.num_failures += 1
+        return False
+
+    def __contains__(self, obj):
+        '''
+        Return True if the object has been added 
+        and False if it has not been.
+        '''
+        return any(self.table[index] == obj for index in self._indices(obj))
+
+    def avg_probing_steps(self):
+        '''
+        Returns the average number of extra buckets a lookup checks,
+        0 for items in their first bucket and 1 for the second.
+        '''
+        return sum(length * count for length, count in self.probe_length_histogram().items()) / self.n
+
+    def probe_length_histogram(self):
+        '''
+        Return {probing steps: number of items}, where items in the bucket
+        of their first hash function take 0 steps and the rest take 1.
+        '''
+        lengths = Counter()
+        for index, obj in enumerate(self.table):
+            if obj is not None:
+                lengths[0 if self._indices(obj)[0] == index else 1] += 1
+        return dict(sorted(lengths.items()))
+
+    def displacement_histogram(self):
+        '''
+        Return {evictions: number of inserts that caused that many evictions}.
+        '''
+        return dict(sorted(self.displacements.items()))
+
+def format_histograms(title, histograms):
+    '''
+    Lay out several {value: count} histograms as columns of one table.
+
+    Inputs:
+        - title: label of the first column
+        - histograms: dict mapping a column name to a histogram
+    '''
+    values = sorted(set().union(*histograms.values()))
+    widths = [max(len(name), 9) for name in histograms]
+    lines = [f"  {title:<14}" + "".join(f"{name:>{w + 2}}" for name, w in zip(histograms, widths))]
+    for value in values:
+        lines.append(f"  {value:<14}" + "".join(f"{hist.get(value, 0):>{w + 2}}"
+                                                 for hist, w in zip(histograms.values(), widths)))
+    return "\n".join(lines)
+
+def merge_histograms(histograms):
+    total = Counter()
+    for hist in histograms:
+        total.update(hist)
+    return dict(sorted(total.items()))
+
+HASHSET_TYPES = {
+    "chaining": HashSetWithChaining,
+    "probing": HashSetWithProbing,
+    "robinhood": HashSetWithRobinHood,
+    # fixed size, so the cuckoo column is compared at the same load factor
+    # as the others; rejected inserts are reported instead
+    "cuckoo": partial(HashSetWithCuckoo, grow=False),
+}
+
+_worker_words = None
+_worker_cache = None
+
+def share_words(words):
+    '''
+    Copy the words into a new shared memory block: n + 1 int64 offsets
+    followed by the UTF-8 bytes of every word. The caller has to close
+    and unlink the returned block.
+    '''
+    encoded = [word.encode("utf8") for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    shm = shared_memory.SharedMemory(create=True, size=max(offsets.nbytes + int(offsets[-1]), 1))
+    shm.buf[:offsets.nbytes] = offsets.tobytes()
+    shm.buf[offsets.nbytes:offsets.nbytes + int(offsets[-1])] = b"".join(encoded)
+    return shm
+
+def _attach_words(shm_name, num_words, cache_size):
+    '''
+    Pool initializer: read the shared word list once per worker process,
+    and give the worker its own HashCache if cache_size is non-zero.
+    '''
+    global _worker_words, _worker_cache
+    _worker_cache = HashCache(cache_size) if cache_size else None
+    shm = shared_memory.SharedMemory(name=shm_name)
+    offsets = np.frombuffer(shm.buf, dtype=np.int64, count=num_words + 1).tolist()
+    arena = bytes(shm.buf[8 * (num_words + 1):8 * (num_words + 1) + offsets[-1]])
+    _worker_words = [arena[start:end].decode("utf8") for start, end in zip(offsets, offsets[1:])]
+    shm.close()
+
+def run_hashset_trial(task, words=None, cache=None):
+    '''
+    Build one hash set of the (structure, size, seed) in `task`, insert
+    every word and verify it is found again. Without `words`, the worker's
+    shared word list and hash cache are used.
+
+    Returns (summary, probe length histogram, displacement histogram,
+    number of rejected inserts), where summary is max_num_in_bucket() for
+    chaining and the rounded avg_probing_steps() for every other structure.
+    Words whose insert was rejected are not looked up.
+    '''
+    structure, size, seed = task
+    if words is None:
+        words, cache = _worker_words, _worker_cache
+    hashset = HASHSET_TYPES[structure](size=size, seed=seed, cache=cache)
+    inserted = [word for word in words if hashset.insert(word)]
+    for word in inserted:
+        assert word in hashset, "word %s is missing in %s hashset" % (word, structure)
+
+    if structure == "chaining":
+        summary = hashset.max_num_in_bucket()
+    else:
+        summary = round(hashset.avg_probing_steps(), 1)
+    return (summary, hashset.probe_length_histogram(), hashset.displacement_histogram(),
+            getattr(hashset, "num_failures", 0))
+
+def run_hashset_experiment(words, tasks, workers=1, cache=None):
+    '''
+    Run run_hashset_trial for every (structure, size, seed) task and
+    return {task: result}. With more than one worker the tasks are spread
+    over a process pool; the words are handed to each worker once through
+    shared memory, and results come back in task order either way.
+
+    `cache` is a HashCache shared by every hash set; in a pool each worker
+    gets an empty cache of the same capacity instead.
+    '''
+    tasks = list(tasks)
+    if workers <= 1:
+        return {task: run_hashset_trial(task, words, cache) for task in tasks}
+
+    shm = share_words(words)
+    cache_size = cache.capacity if cache is not None else 0
+    try:
+        with Pool(workers, initializer=_attach_words, initargs=(shm.name, len(words), cache_size)) as pool:
+            results = pool.map(run_hashset_trial, tasks)
+    finally:
+        shm.close()
+        shm.unlink()
+    return dict(zip(tasks, results))
+
 if __name__ == "__main__":
-    for fn in sys.argv[1:]:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--histograms", action="store_true",
+                        help="also print probe-length and displacement histograms of every hash set variant")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes the (structure, size, seed) grid is spread over")
+    parser.add_argument("--hash-cache", type=int, default=0, metavar="ENTRIES",
+                        help="memoize up to ENTRIES (seed, word) hash values across the sweep")
+    args = parser.parse_args()
+    cache = HashCache(args.hash_cache) if args.hash_cache else None
+
+    sizes = [100, 150, 200, 500]
+    seeds = range(10)  # 10 different hash-sets per structure and size
+    structures = list(HASHSET_TYPES) if args.histograms else ["chaining", "probing"]
+
+    for fn in args.files:
         words = get_words(fn)
 
         # Vary the size of your hash table
-        for iter_num, size in enumerate([100, 150, 200, 500]):
+        for size in sizes:
             assert len(set(words)) <= size, \
                 "Can't put more items into a HashSetWithProbing than there are buckets"
 
-            hashsets_ch = [HashSetWithChaining(size=size, seed=seed) for seed in range(10)] # 10 different hash-sets
-            hashsets_pr = [HashSetWithProbing(size=size, seed=seed) for seed in range(10)] 
-
-            # Insert all the words, and verify their insertion
-            for word in words:
-                for pos in range(len(hashsets_ch)):
-                    hashsets_ch[pos].insert(word)
-                    hashsets_pr[pos].insert(word)
-            for word in words:
-                assert word in hashsets_ch[0], "word %s is missing in chaining hashset" % word
-                assert word in hashsets_pr[0], "word %s is missing in probing hashset" % word
+        # Insert all the words into every hash set, and verify their insertion
+        tasks = [(structure, size, seed) for size in sizes for structure in structures for seed in seeds]
+        results = run_hashset_experiment(words, tasks, workers=args.workers, cache=cache)
 
+        for size in sizes:
             ## Print the maximum number of items in a given hash bucket for each hash set
             ## as a list of integers, along with the average maximum count, and the word
             ## that occurs the most in the input text
-            result_ch = [x.max_num_in_bucket() for x in hashsets_ch]
-            result_pr = [round(x.avg_probing_steps(), 1) for x in hashsets_pr]
+            result_ch = [results["chaining", size, seed][0] for seed in seeds]
+            result_pr = [results["probing", size, seed][0] for seed in seeds]
 
             avg_maxcount = sum(result_ch) / len(result_pr)
             avg_probingsteps = round(sum(result_pr)/len(result_pr), 1)
 
             print(f"chaining: {fn}, {size}, {result_ch}, {avg_maxcount}")
-            print(f"probing:  {fn}, {size}, {result_pr}, {avg_probingsteps}")
\ No newline at end of file
+            print(f"probing:  {fn}, {size}, {result_pr}, {avg_probingsteps}")
+
+            if args.histograms:
+                # Histograms are summed over the 10 seeds of each variant
+                print(f"histograms: {fn}, {size}")
+                print(format_histograms("probe length", {structure: merge_histograms(results[structure, size, seed][1] for seed in seeds)
+                                                         for structure in structures}))
+                print(format_histograms("displacement", {structure: merge_histograms(results[structure, size, seed][2] for seed in seeds)
+                                                         for structure in structures}))
+                print(f"  cuckoo rejected inserts per seed (table size fixed at {size}): "
+                      f"{[results['cuckoo', size, seed][3] for seed in seeds]}")
+
+    if cache is not None and args.workers <= 1:
+        print(f"hash cache: hits = {cache.hits}, misses = {cache.misses}, hit rate = {cache.hit_rate():.3f}",
+              file=sys.stderr)
\ No newline at end of file
@@ -1,35 +1,159 @@
 from ctypes import sizeof
 import xxhash
+import numpy as np
+from itertools import repeat, islice
 import subprocess
 import os
 import sys
+import mmap
+import re
+import math
+from statistics import NormalDist
+import argparse
+import json
+import struct
+import time
+from multiprocessing import Pool
+from collections import OrderedDict
+from functools import lru_cache, partial
+
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
 
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
+
+class HashCache(object):
+    """
+    Bounded memo of HashXX32 results keyed by (seed, token). The raw hash
+    does not depend on the table size, so one cache can be shared by every
+    hasher of a sweep over seeds, table sizes and repeated trials.
+
+    The entries of one seed form a column, a functools.lru_cache keyed by
+    the token alone, so a hit is a single C-level dict lookup instead of a
+    (seed, token) tuple lookup that costs about as much as xxhash itself.
+    Eviction works on whole columns: opening a new seed while more than
+    `capacity` entries are held drops the least recently used seeds first.
+    """
+    def __init__(self, capacity):
+        """
+        Description of attributes:
+            capacity - number of (seed, token) entries above which the
+                       least recently used seeds are evicted
+            columns - seed -> memoized hash function of that seed, in
+                      least to most recently used order
+            size - number of (seed, token) entries held
+            misses - number of lookups that had to call xxhash
+        """
+        self.capacity = capacity
+        self.columns = OrderedDict()
+        self.size = 0
+        self.misses = 0
+        self.evicted_hits = 0
+
+    def column(self, seed):
+        '''Return the memoized hash function of `seed`, opening it if needed.'''
+        column = self.columns.get(seed)
+        if column is not None:
+            self.columns.move_to_end(seed)
+            return column
+        while self.columns and self.size >= self.capacity:
+            _, evicted = self.columns.popitem(last=False)
+            info = evicted.cache_info()
+            self.size -= info.currsize
+            self.evicted_hits += info.hits
+        column = self.columns[seed] = lru_cache(maxsize=None)(partial(self._miss, seed))
+        return column
+
+    def _miss(self, seed, o):
+        self.misses += 1
+        self.size += 1
+        return xxhash.xxh32_intdigest(o, seed) % sys.maxsize
+
+    @property
+    def hits(self):
+        '''Number of lookups answered from the cache.'''
+        return self.evicted_hits + sum(column.cache_info().hits for column in self.columns.values())
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
 
 class HashXX32(object):
-    def __init__(self, seed):
+    def __init__(self, seed, cache=None):
+        self.seed = seed
+        self.cache = cache
         self.h = xxhash.xxh32(seed=seed)
+        if cache is not None:
+            self.hash = cache.column(seed)
 
     def hash(self, o):
         self.h.reset()
         self.h.update(o)
         return self.h.intdigest() % sys.maxsize
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
 class MultiChoicePerfectionistHashSet(object):
     """
     This hashset is defined by the multiple hash functions (num_hashers) used 
     when it comes to insert an element into the table.
     """
-    def __init__(self, size, seed, num_hashers = 2):
+    def __init__(self, size, seed, num_hashers = 2, cache=None):
         """
         Description of attributes:
             hashers - list of hash functions, sorted by priority of hash index 
-                      (use first function, then second, etc.)
+                      (use first function, then second, etc.). They look hash
+                      values up in `cache`, an optional HashCache, first.
             size - number of buckets in the hash table
             table - the actual hash table
         """
-        self.hashers = [HashXX32(seed * (idx + 1)) for idx in range(num_hashers)] # IMPORTANT: Don't change this instantiation
+        self.hashers = [HashXX32(seed * (idx + 1), cache) for idx in range(num_hashers)] # IMPORTANT: Don't change this instantiation
         self.size = size
         # raise NotImplementedError()
         self.table = [None] * self.size
@@ -67,14 +191,16 @@ class OneChoicePerfectionistHashSet(object):
     This hashset will use one hash function to determine 
     where to insert an element.
     """
-    def __init__(self, size, seed):
+    def __init__(self, size, seed, cache=None):
         """
         Description of attributes:
-            hasher - hash function you will use for inserting elements 
+            hasher - hash function you will use for inserting elements.
+                     It looks hash values up in `cache`, an optional
+                     HashCache, before calling xxhash.
             size - number of buckets in the hash table
             table - the actual hash table
         """
-        self.hasher = HashXX32(seed)
+        self.hasher = HashXX32(seed, cache)
         self.size = size
         # raise NotImplementedError()
         self.table = [None]*self.size
@@ -105,34 +231,446 @@ class OneChoicePerfectionistHashSet(object):
         # raise NotImplementedError()
 
 
-def make_perfectionist_hashset(items, tablesize, seed, type, num_hashers = 2):
+def make_perfectionist_hashset(items, tablesize, seed, type, num_hashers = 2, cache=None):
     assert len(set(items)) <= tablesize, \
         "Can't put more items into a table than there are buckets"
     iter_num = 1
     while True:
         if type == 1:
-            hs = OneChoicePerfectionistHashSet(tablesize, seed=iter_num + seed)
+            hs = OneChoicePerfectionistHashSet(tablesize, seed=iter_num + seed, cache=cache)
         else:
-            hs = MultiChoicePerfectionistHashSet(tablesize, seed=iter_num + seed, num_hashers=num_hashers)
+            hs = MultiChoicePerfectionistHashSet(tablesize, seed=iter_num + seed, num_hashers=num_hashers, cache=cache)
         # Insert all items, and exit the loop in case of success
         if all(hs.insert(item) for item in items):
             return hs, iter_num
         iter_num += 1
 
+def _multi_choice_fits(keys, first_choices, seeds, tablesize):
+    '''
+    Replay MultiChoicePerfectionistHashSet.insert for the distinct `keys`.
+    first_choices holds every key's bucket under seeds[0]; the buckets of
+    the lower-priority seeds are only hashed for keys whose earlier choices
+    are taken. Return True if every key finds an empty bucket.
+    '''
+    occupied = bytearray(tablesize)
+    for key, index in zip(keys, first_choices.tolist()):
+        if not occupied[index]:
+            occupied[index] = 1
+            continue
+        for seed in seeds[1:]:
+            index = xxhash.xxh32_intdigest(key, seed) % tablesize
+            if not occupied[index]:
+                occupied[index] = 1
+                break
+        else:
+            return False
+    return True
+
+def count_perfectionist_trials(items, tablesize, seed, type, num_hashers = 2):
+    '''
+    Fast path of make_perfectionist_hashset that returns the same iter_num
+    without building any hash set. Each trial hashes all distinct items in
+    one HashXX32.hash_batch call. A one-choice trial fails if the sorted
+    bucket indices contain a repeat; a multi-choice trial replays the
+    priority-ordered placement on a bytearray of occupied buckets.
+    '''
+    assert len(set(items)) <= tablesize, \
+        "Can't put more items into a table than there are buckets"
+    # re-inserting an item always succeeds, so only the first occurrence matters
+    keys = list(dict.fromkeys(items))
+    iter_num = 1
+    while True:
+        trial_seed = iter_num + seed
+        indices = HashXX32.hash_batch(keys, [trial_seed])[:, 0] % tablesize
+        if type == 1:
+            indices.sort()
+            if not (indices[1:] == indices[:-1]).any():
+                return iter_num
+        else:
+            seeds = [trial_seed * (idx + 1) for idx in range(num_hashers)]
+            if _multi_choice_fits(keys, indices, seeds, tablesize):
+                return iter_num
+        iter_num += 1
+
+class MinimalPerfectHash(object):
+    """
+    BBHash-style minimal perfect hash function over a static key set.
+
+    Level 0 hashes every key into a bit array of about gamma * n bits and
+    sets the bits hit by exactly one key; keys that collided move on to
+    level 1, which does the same with the next seed, and so on. A key maps
+    to the number of set bits before its bit across all levels, so the n
+    keys map to 0 .. n - 1 without collisions. Keys still colliding after
+    max_levels go into a small fallback table. With gamma = 1 the levels
+    take about e bits per key, plus one uint32 rank sample per 512 bits.
+    """
+    MAGIC = b"MPHF"
+    VERSION = 1
+
+    def __init__(self, keys, gamma=1.0, seed=0, max_levels=32):
+        """
+        Description of attributes:
+            seed - level l is hashed with HashXX32(seed + l)
+            num_keys - number of distinct keys
+            level_bits - number of bits of each level, always a multiple of 64
+            words - all level bit arrays back to back, as little-endian uint64
+            ranks - number of set bits before every 512-bit block of words
+            fallback - {key bytes: value} of the keys no level could place
+            build_seconds - wall-clock time the build took
+        """
+        start = time.perf_counter()
+        remaining = list(dict.fromkeys(self._key_bytes(key) for key in keys))
+        self.seed = seed
+        self.num_keys = len(remaining)
+        self.level_bits = []
+        levels = []
+        for level in range(max_levels):
+            if not remaining:
+                break
+            num_bits = 64 * max(1, math.ceil(gamma * len(remaining) / 64))
+            positions = HashXX32.hash_batch(remaining, [seed + level])[:, 0].astype(np.int64) % num_bits
+            placed = np.bincount(positions, minlength=num_bits)[positions] == 1
+            bits = np.zeros(num_bits, dtype=bool)
+            bits[positions[placed]] = True
+            levels.append(np.packbits(bits, bitorder="little"))
+            self.level_bits.append(num_bits)
+            remaining = [key for key, done in zip(remaining, placed.tolist()) if not done]
+
+        self.words = np.concatenate(levels).view("<u8") if levels else np.zeros(0, dtype="<u8")
+        self.ranks = self._compute_ranks(self.words)
+        num_placed = self.num_keys - len(remaining)
+        self.fallback = {key: num_placed + i for i, key in enumerate(remaining)}
+        self.build_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _key_bytes(key):
+        return key.encode("utf8") if isinstance(key, str) else bytes(key)
+
+    @staticmethod
+    def _compute_ranks(words):
+        popcounts = np.unpackbits(words.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+        padded = np.zeros(-(-len(words) // 8) * 8, dtype=np.int64)
+        padded[:len(words)] = popcounts
+        ranks = np.zeros(len(padded) // 8 + 1, dtype="<u4")
+        np.cumsum(padded.reshape(-1, 8).sum(axis=1), out=ranks[1:])
+        return ranks
+
+    def lookup(self, key):
+        '''
+        Return the value in 0 .. num_keys - 1 assigned to `key`. Keys that
+        were not in the build set map to an arbitrary value.
+        '''
+        key = self._key_bytes(key)
+        offset = 0
+        for level, num_bits in enumerate(self.level_bits):
+            position = offset + xxhash.xxh32_intdigest(key, self.seed + level) % num_bits
+            word_index = position >> 6
+            word = int(self.words[word_index])
+            if (word >> (position & 63)) & 1:
+                rank = int(self.ranks[word_index >> 3])
+                for index in range(word_index & ~7, word_index):
+                    rank += bin(int(self.words[index])).count("1")
+                return rank + bin(word & ((1 << (position & 63)) - 1)).count("1")
+            offset += num_bits
+        return self.fallback.get(key, 0)
+
+    def __call__(self, key):
+        return self.lookup(key)
+
+    def __len__(self):
+        return self.num_keys
+
+    def bits_per_key(self):
+        '''
+        Return the size of the serialized function in bits per key.
+        '''
+        return 8 * len(self.to_bytes()) / max(self.num_keys, 1)
+
+    def to_bytes(self):
+        '''
+        Serialize to a little-endian byte string: a header with the magic,
+        version, seed, key count and level count, the bits of every level,
+        the uint64 words and uint32 rank samples, and finally the fallback
+        keys as (length, bytes, value) records.
+        '''
+        header = struct.pack("<4sIIQI", self.MAGIC, self.VERSION, self.seed, self.num_keys, len(self.level_bits))
+        parts = [header, struct.pack(f"<{len(self.level_bits)}Q", *self.level_bits),
+                 self.words.tobytes(), self.ranks.tobytes(), struct.pack("<I", len(self.fallback))]
+        for key, value in self.fallback.items():
+            parts.append(struct.pack("<IQ", len(key), value) + key)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        '''
+        Rebuild a function written by to_bytes. The words and rank samples
+        are NumPy views into `buffer`, so nothing but the header and the
+        fallback table is parsed or copied.
+        '''
+        magic, version, seed, num_keys, num_levels = struct.unpack_from("<4sIIQI", buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("Not a minimal perfect hash function file")
+        offset = struct.calcsize("<4sIIQI")
+        mphf = cls.__new__(cls)
+        mphf.seed = seed
+        mphf.num_keys = num_keys
+        mphf.level_bits = list(struct.unpack_from(f"<{num_levels}Q", buffer, offset))
+        offset += 8 * num_levels
+        num_words = sum(mphf.level_bits) // 64
+        mphf.words = np.frombuffer(buffer, dtype="<u8", count=num_words, offset=offset)
+        offset += 8 * num_words
+        num_ranks = -(-num_words // 8) + 1
+        mphf.ranks = np.frombuffer(buffer, dtype="<u4", count=num_ranks, offset=offset)
+        offset += 4 * num_ranks
+        num_fallback, = struct.unpack_from("<I", buffer, offset)
+        offset += 4
+        mphf.fallback = {}
+        for _ in range(num_fallback):
+            length, value = struct.unpack_from("<IQ", buffer, offset)
+            offset += 12
+            mphf.fallback[bytes(buffer[offset:offset + length])] = value
+            offset += length
+        mphf.build_seconds = 0.0
+        return mphf
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Memory-map a file written by save and answer lookups from the mapping.
+        '''
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_bytes(mm)
+
+def expected_one_choice_trials(num_items, tablesize):
+    '''
+    Analytic expected number of trials of the one-choice set: a trial
+    succeeds when num_items distinct items land in distinct buckets, which
+    happens with probability p = prod_{i < num_items} (1 - i / tablesize),
+    so the number of trials is geometric with mean 1 / p.
+    '''
+    p = 1.0
+    for i in range(num_items):
+        p *= 1 - i / tablesize
+    return 1 / p
+
+def estimate_avg_trials(items, table_size, type, num_hashers = 2, ci_width = 0.01, confidence = 0.95,
+                        min_iters = 100, max_iters = 25000, cache=None, fast=False):
+    '''
+    Run iterations i = 0, 1, ... of one (table_size, num_hashers)
+    configuration, with the driver's seed schedule, and stop as soon as the
+    confidence interval of the mean trial count is at most ci_width wide
+    (after at least min_iters and at most max_iters iterations). The mean
+    and variance are tracked with Welford's update.
+
+    Trial counts are mostly 1 with rare failures, so a run of 1s has zero
+    sample variance. The variance is therefore floored at p (1 - p) with
+    the rule-of-three bound p = 3 / n on P(trials > 1), which keeps the
+    interval from collapsing to zero width before any failure is seen.
+
+    Returns (avg_trials, half width of the interval, iterations run).
+    '''
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    mean = 0.0; m2 = 0.0; half_width = math.inf
+    for i in range(max_iters):
+        if fast:
+            num_trials = count_perfectionist_trials(items, table_size, i * 1000, type, num_hashers=num_hashers)
+        else:
+            hs, num_trials = make_perfectionist_hashset(items, table_size, i * 1000, type,
+                                                        num_hashers=num_hashers, cache=cache)
+        delta = num_trials - mean
+        mean += delta / (i + 1)
+        m2 += delta * (num_trials - mean)
+        if i + 1 >= max(min_iters, 2):
+            p = min(3 / (i + 1), 0.5)
+            half_width = z * math.sqrt(max(m2 / i, p * (1 - p)) / (i + 1))
+            if 2 * half_width <= ci_width:
+                return mean, half_width, i + 1
+    return mean, half_width, max_iters
+
+_worker_items = None
+_worker_cache = None
+
+def _init_trial_worker(items, cache_size):
+    '''
+    Pool initializer: receive the key set once per worker process.
+    '''
+    global _worker_items, _worker_cache
+    _worker_items = items
+    _worker_cache = HashCache(cache_size) if cache_size else None
+
+def run_trial_chunk(table_size, multihasher_n, start, stop, items=None, cache=None, fast=False):
+    '''
+    Run iterations [start, stop) of the perfectionist hashing sweep for one
+    table size, with the same seed schedule as the original driver:
+    iteration i tries seeds i * 1000 + 1, i * 1000 + 2, ... until a set
+    is built. Without `items`, the worker's key set and cache are used.
+    With `fast`, trials go through count_perfectionist_trials instead.
+
+    Returns (nt1, nt_multi): the trial counts of the one-choice set and
+    {num_hashers: trial counts} of the multi-choice sets, in iteration order.
+    '''
+    if items is None:
+        items, cache = _worker_items, _worker_cache
+    nt1 = []; nt_multi = {n : [] for n in multihasher_n}
+    if fast:
+        for i in range(start, stop):
+            nt1.append(count_perfectionist_trials(items, table_size, i * 1000, 1))
+            for n in multihasher_n:
+                nt_multi[n].append(count_perfectionist_trials(items, table_size, i * 1000, 2, num_hashers=n))
+        return nt1, nt_multi
+
+    for i in range(start, stop):
+        perfect_hs, num_trials1 = make_perfectionist_hashset(items, table_size, i * 1000, 1, cache=cache)
+        nt1.append(num_trials1)
+        for n in multihasher_n:
+            multichoice_hs, num_trials = make_perfectionist_hashset(items, table_size, i * 1000, 2, num_hashers=n, cache=cache)
+            nt_multi[n].append(num_trials)
+    return nt1, nt_multi
+
+class TrialCheckpoint(object):
+    """
+    JSON file holding the tallies of every finished chunk of a sweep, so
+    an interrupted run can pick up where it stopped.
+    """
+    def __init__(self, path, params):
+        """
+        Description of attributes:
+            path - location of the checkpoint file, None to keep nothing on disk
+            params - settings the chunks were computed with; resuming from a
+                     file written with different settings raises ValueError
+            chunks - {chunk key: [nt1, nt_multi]} of the finished chunks
+        """
+        self.path = path
+        self.params = params
+        self.chunks = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved["params"] != params:
+                raise ValueError(f"Checkpoint {path} was written with different settings: {saved['params']}")
+            self.chunks = saved["chunks"]
+
+    def get(self, key):
+        '''
+        Return (nt1, nt_multi) of a finished chunk, or None.
+        '''
+        if key not in self.chunks:
+            return None
+        nt1, nt_multi = self.chunks[key]
+        return nt1, {int(n): trials for n, trials in nt_multi.items()}
+
+    def put(self, key, nt1, nt_multi):
+        '''
+        Record a finished chunk and rewrite the file atomically.
+        '''
+        self.chunks[key] = [nt1, nt_multi]
+        if self.path is None:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"params": self.params, "chunks": self.chunks}, f)
+        os.replace(tmp_path, self.path)
+
+def run_trials(items, table_size, multihasher_n, num_iters, checkpoint, key_prefix="",
+               workers=1, chunk_size=500, cache=None, fast=False):
+    '''
+    Run the num_iters iterations of the sweep for one table size in chunks
+    of chunk_size, spread over `workers` processes. Chunks already in the
+    TrialCheckpoint are skipped and every new chunk is saved as it ends.
+
+    Returns (nt1, nt_multi) in iteration order, identical to a serial run.
+    '''
+    chunks = [(start, min(start + chunk_size, num_iters)) for start in range(0, num_iters, chunk_size)]
+    keys = [f"{key_prefix}{table_size}:{start}" for start, stop in chunks]
+    pending = [(chunk, key) for chunk, key in zip(chunks, keys) if checkpoint.get(key) is None]
+
+    if workers <= 1:
+        for (start, stop), key in pending:
+            checkpoint.put(key, *run_trial_chunk(table_size, multihasher_n, start, stop, items, cache, fast))
+    elif pending:
+        cache_size = cache.capacity if cache is not None else 0
+        with Pool(workers, initializer=_init_trial_worker, initargs=(items, cache_size)) as pool:
+            results = [pool.apply_async(run_trial_chunk, (table_size, multihasher_n, start, stop),
+                                        {"fast": fast})
+                       for (start, stop), key in pending]
+            for ((start, stop), key), result in zip(pending, results):
+                checkpoint.put(key, *result.get())
+
+    nt1 = []; nt_multi = {n : [] for n in multihasher_n}
+    for key in keys:
+        chunk_nt1, chunk_nt_multi = checkpoint.get(key)
+        nt1 += chunk_nt1
+        for n in multihasher_n:
+            nt_multi[n] += chunk_nt_multi[n]
+    return nt1, nt_multi
+
 if __name__ == "__main__":
-    for fn in sys.argv[1:]:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--hash-cache", type=int, default=0, metavar="ENTRIES",
+                        help="memoize up to ENTRIES (seed, word) hash values across the sweep")
+    parser.add_argument("--iterations", type=int, default=25000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes the iterations are spread over")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="iterations per unit of work and per checkpoint entry")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="save finished chunks to PATH and resume from it if it exists")
+    parser.add_argument("--fast", action="store_true",
+                        help="count trials with vectorized collision checks instead of building hash sets")
+    parser.add_argument("--mphf", action="store_true",
+                        help="only build a minimal perfect hash function of each file's words and report its size")
+    parser.add_argument("--ci-width", type=float, metavar="WIDTH",
+                        help="stop each configuration once the confidence interval of avg_trials is this wide; "
+                             "--iterations becomes the upper limit. Runs serially: --workers and "
+                             "--checkpoint are ignored")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--min-iterations", type=int, default=100)
+    args = parser.parse_args()
+    cache = HashCache(args.hash_cache) if args.hash_cache else None
+
+    multihasher_n = list(range(2, 6))
+    checkpoint = TrialCheckpoint(args.checkpoint, {"iterations": args.iterations, "chunk_size": args.chunk_size,
+                                                   "multihasher_n": multihasher_n})
+    for fn in args.files:
         stringset = get_words(fn)
         set_size = len(stringset)
-        multihasher_n = list(range(2, 6))
+        if args.mphf:
+            mphf = MinimalPerfectHash(stringset)
+            assert sorted(mphf(word) for word in set(stringset)) == list(range(len(mphf))), \
+                "minimal perfect hash function is not a bijection"
+            print(f"MPHF: num_keys = {len(mphf)}, levels = {len(mphf.level_bits)}, "
+                  f"bits_per_key = {mphf.bits_per_key():.3f}, build_seconds = {mphf.build_seconds:.4f}")
+            continue
+        if args.ci_width is not None:
+            num_distinct = len(set(stringset))
+            for table_size in (10000, 5000, 2000):
+                for n in [1] + multihasher_n:
+                    avg_trials, half_width, num_iters = estimate_avg_trials(
+                        stringset, table_size, 1 if n == 1 else 2, num_hashers=n, ci_width=args.ci_width,
+                        confidence=args.confidence, min_iters=args.min_iterations, max_iters=args.iterations,
+                        cache=cache, fast=args.fast)
+                    label = "One-Choice" if n == 1 else f"Multi-Choice (n = {n})"
+                    print(f"{label}: num_words = {set_size}, size = {table_size}, avg_trials = {avg_trials} "
+                          f"+/- {half_width:.5f}, iterations = {num_iters}", end="")
+                    if n == 1:
+                        print(f", analytic = {expected_one_choice_trials(num_distinct, table_size)}", end="")
+                    print()
+            continue
         for table_size in (10000, 5000, 2000):
-            nt1 = []; nt_multi = {n : [] for n in multihasher_n}
-            for i in range(25000):
-                perfect_hs, num_trials1 = make_perfectionist_hashset(stringset, table_size, i * 1000, 1)
-                nt1.append(num_trials1)
-                for n in multihasher_n:
-                    multichoice_hs, num_trials = make_perfectionist_hashset(stringset, table_size, i * 1000, 2, num_hashers=n)
-                    nt_multi[n].append(num_trials)
+            nt1, nt_multi = run_trials(stringset, table_size, multihasher_n, args.iterations, checkpoint,
+                                       key_prefix=f"{fn}:", workers=args.workers, chunk_size=args.chunk_size,
+                                       cache=cache, fast=args.fast)
 
             print(f"One-Choice: num_words = {set_size}, size = {table_size}, avg_trials = {sum(nt1) / len(nt1)}")
             for n in multihasher_n:
-                print(f"Multi-Choice (n = {n}): num_words = {set_size}, size = {table_size}, avg_trials = {sum(nt_multi[n]) / len(nt_multi[n])}")
\ No newline at end of file
+                print(f"Multi-Choice (n = {n}): num_words = {set_size}, size = {table_size}, avg_trials = {sum(nt_multi[n]) / len(nt_multi[n])}")
+
+    if cache is not None and args.workers <= 1:
+        print(f"hash cache: hits = {cache.hits}, misses = {cache.misses}, hit rate = {cache.hit_rate():.3f}",
+              file=sys.stderr)
\ No newline at end of file
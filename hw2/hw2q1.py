@@ -1,14 +1,59 @@
 import xxhash
+import numpy as np
+from itertools import repeat, islice
 import subprocess
 import os
 import sys
+import mmap
+import re
+import math
+import struct
+import time
+import argparse
+from multiprocessing import Pool, shared_memory
 
 
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
+
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
 
 class HashXX32(object):
     def __init__(self, seed):
+        self.seed = seed
         self.h = xxhash.xxh32(seed=seed)
 
     def hash(self, o):
@@ -16,8 +61,67 @@ class HashXX32(object):
         self.h.update(o)
         return self.h.intdigest() % sys.maxsize
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
+class HashXX64(object):
+    """
+    64-bit xxhash, used to derive all k indices of a key from one hash
+    (Kirsch-Mitzenmacher double hashing).
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.h = xxhash.xxh64(seed=seed)
+
+    def hash(self, o):
+        self.h.reset()
+        self.h.update(o)
+        return self.h.intdigest()
+
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Same as HashXX32.hash_batch, returning a uint64 matrix.
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint64)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh64_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint64, count=len(objs))
+        return hashes
+
+_POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+def popcount(buffer, chunk_size=1 << 20):
+    '''
+    Return the number of set bits in a bytes-like buffer, counted a chunk
+    of bytes at a time so no large temporary is created.
+    '''
+    view = np.frombuffer(buffer, dtype=np.uint8)
+    return sum(int(_POPCOUNT_TABLE[view[start:start + chunk_size]].sum(dtype=np.int64))
+               for start in range(0, len(view), chunk_size))
+
 class BloomFilter(object):
-    def __init__(self, size, num_hash, seeds):
+    # file format: header, num_hash uint64 seeds, zero padding to a multiple
+    # of 8 bytes, then the counters packed counter_width bits each
+    MAGIC = b"BLMF"
+    VERSION = 1
+    HEADER = "<4sHBBQI"  # magic, version, hash mode, counter width, size, num_hash
+    INDEPENDENT, DOUBLE_HASHING, BLOCKED = 0, 1, 2
+
+    def __init__(self, size, num_hash, seeds, double_hashing=False):
         '''
         Initialize a Bloom filter.
 
@@ -25,6 +129,8 @@ class BloomFilter(object):
             - size: number of slots in the Bloom filter (n)
             - num_hash: number of hash functions (k)
             - seeds: seeds to initialize hash functions
+            - double_hashing: derive all k indices from one 64-bit hash
+              seeded with seeds[0] instead of running k hash functions
 
         Raises:
             - ValueError if the number of seeds differ with num_hash
@@ -35,12 +141,45 @@ class BloomFilter(object):
         # raise NotImplementedError()
         if num_hash != len(self._hashers):
             raise ValueError('Number of hash functions should equal number of seeds.')
-        self._bits = [0] * self._size
+        self._double_hashing = double_hashing
+        self._hasher64 = HashXX64(self._hashers[0].seed) if double_hashing else None
+        # bit i lives in byte i // 8 at position i % 8; the array is padded
+        # to whole 64-bit words so it can also be viewed as uint64
+        self._bits = bytearray(8 * ((self._size + 63) // 64))
+
+    def _indices(self, obj):
+        '''
+        Return the `self._num_hash` slot indices of an object: one per hash
+        function, or h1 + i * h2 + (i^3 - i) / 6 for i = 0 .. k - 1 in double
+        hashing mode, where h1 and h2 are the low and high halves of one
+        64-bit hash. The cubic term (enhanced double hashing) keeps the k
+        indices apart when h2 is a multiple of the size, where plain
+        h1 + i * h2 would put all of them on h1.
+        '''
+        if self._double_hashing:
+            hash_val = self._hasher64.hash(obj)
+            h1, h2 = hash_val & 0xFFFFFFFF, hash_val >> 32
+            return [(h1 + i * h2 + (i ** 3 - i) // 6) % self._size for i in range(self._num_hash)]
+        return [hasher.hash(obj) % self._size for hasher in self._hashers]
+
+    def _indices_many(self, objs):
+        '''
+        Vectorized _indices: return a (len(objs), num_hash) int64 matrix
+        whose row i holds the slot indices of objs[i].
+        '''
+        if self._double_hashing:
+            hashes = HashXX64.hash_batch(objs, [self._hasher64.seed])
+            h1, h2 = hashes & 0xFFFFFFFF, hashes >> 32
+            steps = np.arange(self._num_hash, dtype=np.uint64)
+            return ((h1 + steps * h2 + (steps ** 3 - steps) // 6) % self._size).astype(np.int64)
+        hashes = HashXX32.hash_batch(objs, [hasher.seed for hasher in self._hashers])
+        return (hashes % self._size).astype(np.int64)
 
     def insert(self, obj) -> int:
         '''
         Insert an object into the Bloom filter.
-        The object will be hashed with `self._num_hash` distinct hash functions.
+        The object will be hashed with `self._num_hash` distinct hash functions,
+        or with one 64-bit hash in double hashing mode.
 
         Inputs:
             - obj: a bytes-like object.
@@ -49,11 +188,11 @@ class BloomFilter(object):
             - num_collision (int): number of collisions during this insertion operation.
         '''
         num_collision = 0
-        for hasher in self._hashers:
-            index = hasher.hash(obj) % self._size
-            if self._bits[index]:
+        for index in self._indices(obj):
+            mask = 1 << (index & 7)
+            if self._bits[index >> 3] & mask:
                 num_collision += 1
-            self._bits[index] = True
+            self._bits[index >> 3] |= mask
         return num_collision
 
 
@@ -68,57 +207,484 @@ class BloomFilter(object):
             True if `obj` is in the filter; otherwise False.
         '''
         # raise NotImplementedError()
-        hash_results = [hasher.hash(obj) % self._size for hasher in self._hashers]
-        return all(self._bits[i] == 1 for i in hash_results)
+        hash_results = self._indices(obj)
+        return all(self._bits[i >> 3] & (1 << (i & 7)) for i in hash_results)
+
+    def insert_many(self, objs) -> np.ndarray:
+        '''
+        Insert a batch of objects, hashing them all at once and setting
+        their bits with one vectorized scatter.
+
+        Inputs:
+            - objs: a list of bytes-like objects.
+
+        Returns:
+            - num_collision: int array, the number of collisions each insert
+              would have reported if the objects were inserted one by one.
+        '''
+        indices = self._indices_many(objs).ravel()
+        bits = np.frombuffer(self._bits, dtype=np.uint8)
+        positions, masks = indices >> 3, (1 << (indices & 7)).astype(np.uint8)
+        # a slot collides if it was set before the batch or earlier in it
+        collided = (bits[positions] & masks) != 0
+        repeated = np.ones(len(indices), dtype=bool)
+        repeated[np.unique(indices, return_index=True)[1]] = False
+        np.bitwise_or.at(bits, positions, masks)
+        return (collided | repeated).reshape(-1, self._num_hash).sum(axis=1)
+
+    def contains_many(self, objs) -> np.ndarray:
+        '''
+        Check a batch of objects at once.
+
+        Inputs:
+            - objs: a list of bytes-like objects.
+
+        Returns:
+            Boolean array, True where the object is in the filter.
+        '''
+        indices = self._indices_many(objs)
+        bits = np.frombuffer(self._bits, dtype=np.uint8)
+        return ((bits[indices >> 3] >> (indices & 7)) & 1).all(axis=1)
 
     def get_num_set_buckets(self) -> int:
         '''Return the number of set buckets in the Bloom filter.'''
-        return sum(self._bits)
+        return popcount(self._bits)
+
+    def get_buffer(self) -> memoryview:
+        '''
+        Return a zero-copy view of the packed bits: bit i is bit i % 8 of
+        byte i // 8, padded with zeros to a whole number of 64-bit words.
+        '''
+        return memoryview(self._bits)
+
+    def _hash_mode(self):
+        return self.DOUBLE_HASHING if self._double_hashing else self.INDEPENDENT
+
+    def _combine(self, other, ufunc):
+        '''
+        Return a new filter whose bits are ufunc(self bits, other bits),
+        combined a 64-bit word at a time.
+
+        Raises:
+            - ValueError if the filters differ in size, hash functions or hash mode
+        '''
+        if (self._size, self._hash_mode(), [hasher.seed for hasher in self._hashers]) != \
+                (other._size, other._hash_mode(), [hasher.seed for hasher in other._hashers]):
+            raise ValueError('Filters should have the same size, seeds and hash mode.')
+        result = self.from_bytes(bytearray(self.to_bytes()))
+        words = np.frombuffer(result._bits, dtype="<u8")
+        ufunc(words, np.frombuffer(other._bits, dtype="<u8"), out=words)
+        return result
+
+    def union(self, other):
+        '''
+        Return a filter holding the members of both filters, exactly as if
+        all of them had been inserted into one.
+        '''
+        return self._combine(other, np.bitwise_or)
+
+    def intersection(self, other):
+        '''
+        Return a filter whose bits are set in both filters. It contains
+        every common member, and its false positive rate is at most that
+        of either input.
+        '''
+        return self._combine(other, np.bitwise_and)
+
+    def to_bytes(self):
+        '''
+        Serialize to the little-endian file format: the header, the seeds,
+        padding to an 8-byte boundary, and the packed bits as they are
+        held in memory, so the payload can be mapped back as 64-bit words.
+        '''
+        seeds = [hasher.seed for hasher in self._hashers]
+        header = struct.pack(self.HEADER, self.MAGIC, self.VERSION, self._hash_mode(), 1,
+                             self._size, self._num_hash)
+        header += struct.pack(f"<{len(seeds)}Q", *seeds)
+        header += bytes(-len(header) % 8)
+        return header + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        '''
+        Rebuild a filter written by to_bytes. The bits are a view into
+        `buffer`, so nothing but the header is parsed or copied; the filter
+        is read-only if the buffer is.
+        '''
+        magic, version, hash_mode, counter_width, size, num_hash = struct.unpack_from(cls.HEADER, buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION or counter_width != 1:
+            raise ValueError("Not a Bloom filter file")
+        offset = struct.calcsize(cls.HEADER)
+        seeds = struct.unpack_from(f"<{num_hash}Q", buffer, offset)
+        offset += 8 * num_hash
+        offset += -offset % 8
+        filter_cls = BlockedBloomFilter if hash_mode == cls.BLOCKED else BloomFilter
+        bf = filter_cls.__new__(filter_cls)
+        bf._size = size
+        bf._num_hash = num_hash
+        bf._hashers = [HashXX32(seed) for seed in seeds]
+        bf._double_hashing = hash_mode == cls.DOUBLE_HASHING
+        bf._hasher64 = HashXX64(seeds[0]) if hash_mode != cls.INDEPENDENT else None
+        if hash_mode == cls.BLOCKED:
+            bf._num_blocks = size // BlockedBloomFilter.BLOCK_BITS
+        bf._bits = memoryview(buffer)[offset:offset + 8 * ((size + 63) // 64)]
+        return bf
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path, writable=False):
+        '''
+        Memory-map a file written by save and answer queries from the
+        mapping. With writable, inserts go to a private copy-on-write
+        mapping and never reach the file.
+        '''
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+        return cls.from_bytes(mm)
 
     def get_bit_vector(self):
-        return ''.join([str(b*1) for b in self._bits])
+        bits = np.unpackbits(np.frombuffer(self._bits, dtype=np.uint8), count=self._size, bitorder="little")
+        return (bits + ord("0")).tobytes().decode("ascii")
     
-    def compute_fp_fn(self, words, members):
+    def compute_fp_fn(self, words, members, batch_size=1 << 16):
         # words: words to be queried
         # members: members inserted in the bloom filter
+        member_set = set(members)
         fp = 0
         fn = 0
-        for word in words:
+        for start in range(0, len(words), batch_size):
+            batch = words[start:start + batch_size]
+            in_bf = self.contains_many(batch)
+            is_member = np.fromiter((word in member_set for word in batch), dtype=bool, count=len(batch))
             # FP: word not in members but in bf
-            if word not in members and self.__contains__(word):
-                fp += 1
+            fp += int((in_bf & ~is_member).sum())
             # FN: word in members but not in bf
-            elif word in members and not self.__contains__(word):
-                fn += 1
+            fn += int((is_member & ~in_bf).sum())
         return fp, fn
 
 
+class BlockedBloomFilter(BloomFilter):
+    """
+    Bloom filter whose bit array is split into 512-bit (cache-line sized)
+    blocks. Each key picks one block and sets all of its k bits inside
+    it, so an insert or lookup touches one cache line instead of k, at
+    the cost of a somewhat higher false positive rate.
+    """
+    BLOCK_BITS = 512
+
+    def __init__(self, size, num_hash, seeds):
+        '''
+        Initialize a blocked Bloom filter. The size is rounded up to a
+        whole number of blocks, and all indices are derived from one
+        64-bit hash seeded with seeds[0].
+        '''
+        num_blocks = max(1, -(-size // self.BLOCK_BITS))
+        super().__init__(num_blocks * self.BLOCK_BITS, num_hash, seeds)
+        self._num_blocks = num_blocks
+        self._hasher64 = HashXX64(self._hashers[0].seed)
+
+    def _indices(self, obj):
+        '''
+        The high 32 bits of the hash pick the block; within it bit i is
+        (a + i * b) % 512 for a and an odd step b taken from the low bits,
+        so the k bits of a key are distinct.
+        '''
+        hash_val = self._hasher64.hash(obj)
+        base = ((hash_val >> 32) % self._num_blocks) * self.BLOCK_BITS
+        a, b = hash_val & 0xFFFF, ((hash_val >> 16) & 0xFFFF) | 1
+        return [base + (a + i * b) % self.BLOCK_BITS for i in range(self._num_hash)]
+
+    def _hash_mode(self):
+        return self.BLOCKED
+
+    def _indices_many(self, objs):
+        hashes = HashXX64.hash_batch(objs, [self._hasher64.seed])
+        base = ((hashes >> 32) % self._num_blocks) * self.BLOCK_BITS
+        a, b = hashes & 0xFFFF, ((hashes >> 16) & 0xFFFF) | 1
+        steps = np.arange(self._num_hash, dtype=np.uint64)
+        return (base + (a + steps * b) % self.BLOCK_BITS).astype(np.int64)
+
+
+class ScalableBloomFilter(object):
+    """
+    Bloom filter that grows with its contents while keeping the overall
+    false positive rate under a target. It chains BloomFilter layers;
+    when the newest layer holds its planned capacity, a new layer is added
+    with `growth` times the capacity and `tightening` times the error rate.
+    Layer i targets error_rate * (1 - tightening) * tightening^i, a
+    geometric series whose sum is error_rate.
+    """
+    def __init__(self, initial_capacity, error_rate, growth=2, tightening=0.5, seed=0):
+        '''
+        Initialize a scalable Bloom filter.
+
+        Inputs:
+            - initial_capacity: number of items the first layer is sized for
+            - error_rate: target false positive rate of the whole filter
+            - growth: capacity ratio between consecutive layers
+            - tightening: error rate ratio between consecutive layers
+            - seed: first hash seed; every layer gets its own seeds
+
+        Raises:
+            - ValueError if a parameter is out of range
+        '''
+        if initial_capacity < 1:
+            raise ValueError('Initial capacity should be positive.')
+        if not 0 < error_rate < 1 or not 0 < tightening < 1:
+            raise ValueError('Error rate and tightening ratio should be in (0, 1).')
+        if growth < 1:
+            raise ValueError('Growth factor should be at least 1.')
+        self._initial_capacity = initial_capacity
+        self._error_rate = error_rate
+        self._growth = growth
+        self._tightening = tightening
+        self._next_seed = seed
+        self._layers = []
+        self._capacities = []
+        self._num_items = 0
+        self._layer_items = 0
+        self._add_layer()
+
+    @staticmethod
+    def layer_parameters(capacity, error_rate):
+        '''
+        Return the optimal (size, num_hash) of a Bloom filter holding
+        `capacity` items at `error_rate`: m = -n ln p / (ln 2)^2 and
+        k = ceil(log2(1 / p)).
+        '''
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hash = math.ceil(math.log2(1 / error_rate))
+        return size, num_hash
+
+    def _add_layer(self):
+        level = len(self._layers)
+        capacity = math.ceil(self._initial_capacity * self._growth ** level)
+        # the first layer gets error_rate * (1 - r) so the series sums to error_rate
+        error_rate = self._error_rate * (1 - self._tightening) * self._tightening ** level
+        size, num_hash = self.layer_parameters(capacity, error_rate)
+        seeds = range(self._next_seed, self._next_seed + num_hash)
+        self._next_seed += num_hash
+        self._layers.append(BloomFilter(size, num_hash, seeds))
+        self._capacities.append(capacity)
+        self._layer_items = 0
+
+    def insert(self, obj) -> int:
+        '''
+        Insert an object into the newest layer, adding a layer first if it
+        is full. Objects already reported present are not inserted again,
+        so duplicates do not use up capacity.
+
+        Returns:
+            - num_collision: number of collisions in the newest layer, or
+              its number of hash functions if the object was present
+        '''
+        if obj in self:
+            return self._layers[-1]._num_hash
+        if self._layer_items >= self._capacities[-1]:
+            self._add_layer()
+        self._layer_items += 1
+        self._num_items += 1
+        return self._layers[-1].insert(obj)
+
+    def __contains__(self, obj) -> bool:
+        return any(obj in layer for layer in reversed(self._layers))
+
+    def __len__(self) -> int:
+        '''Return the number of distinct items inserted (up to false positives).'''
+        return self._num_items
+
+    @property
+    def num_layers(self) -> int:
+        return len(self._layers)
+
+    def get_num_set_buckets(self) -> int:
+        '''Return the number of set buckets over all layers.'''
+        return sum(layer.get_num_set_buckets() for layer in self._layers)
+
+    def get_size(self) -> int:
+        '''Return the total number of slots over all layers.'''
+        return sum(layer._size for layer in self._layers)
+
+    def expected_fp_rate(self) -> float:
+        '''Upper bound on the false positive rate: 1 - prod(1 - p_i).'''
+        prob_negative = 1.0
+        for level in range(len(self._layers)):
+            prob_negative *= 1 - self._error_rate * (1 - self._tightening) * self._tightening ** level
+        return 1 - prob_negative
+
+
 def bf_insertion(bf, members):
-    num_collision = 0
-    for word in members:
-        num_collision += bf.insert(word)
+    num_collision = int(bf.insert_many(members).sum())
     print(num_collision)
 
 
+def _insert_shard(shm_name, start, length, items):
+    '''
+    Pool task: map the filter image at shm.buf[start:start + length] and
+    insert `items` into it in place. Returns the number of collisions.
+    '''
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bf = BloomFilter.from_bytes(shm.buf[start:start + length])
+    num_collision = int(bf.insert_many(items).sum())
+    # the filter's view has to go before the block can be closed
+    del bf
+    shm.close()
+    return num_collision
+
+def parallel_insert(bf, items, workers=1):
+    '''
+    Insert `items` into `bf` using `workers` processes. Every worker gets a
+    contiguous shard of the items and a copy of the filter in one shared
+    memory block, and the shard filters are OR-ed into `bf` at the end.
+
+    Returns the number of collisions, counted within each shard; this can
+    be lower than what inserting all items into one filter reports.
+    '''
+    items = list(items)
+    if workers <= 1:
+        return int(bf.insert_many(items).sum())
+
+    image = bf.to_bytes()
+    shm = shared_memory.SharedMemory(create=True, size=workers * len(image))
+    try:
+        for worker in range(workers):
+            shm.buf[worker * len(image):(worker + 1) * len(image)] = image
+        bounds = np.linspace(0, len(items), workers + 1).astype(int)
+        tasks = [(shm.name, worker * len(image), len(image), items[lo:hi])
+                 for worker, (lo, hi) in enumerate(zip(bounds, bounds[1:]))]
+        with Pool(workers) as pool:
+            num_collision = sum(pool.starmap(_insert_shard, tasks))
+        # the payload is the last len(bf._bits) bytes of every image
+        images = np.frombuffer(shm.buf, dtype="<u8").reshape(workers, len(image) // 8)
+        np.bitwise_or.reduce(images[:, (len(image) - len(bf._bits)) // 8:], axis=0,
+                             out=np.frombuffer(bf._bits, dtype="<u8"))
+        del images
+    finally:
+        shm.close()
+        shm.unlink()
+    return num_collision
+
+def compare_hash_modes(size, num_hash, members, queries):
+    '''
+    Build one Bloom filter per hashing mode from the same members and
+    measure the false positive rate of each over the queries that are not
+    members, next to the textbook estimate (1 - e^(-kn/m))^k.
+
+    Returns {"independent": rate, "double hashing": rate, "expected": rate}.
+    '''
+    member_set = set(members)
+    non_members = [word for word in queries if word not in member_set]
+    rates = {}
+    for mode, double_hashing in (("independent", False), ("double hashing", True)):
+        bf = BloomFilter(size=size, num_hash=num_hash, seeds=range(num_hash), double_hashing=double_hashing)
+        for word in members:
+            bf.insert(word)
+        rates[mode] = sum(word in bf for word in non_members) / len(non_members)
+    rates["expected"] = (1 - math.exp(-num_hash * len(member_set) / size)) ** num_hash
+    return rates
+
+def hash_modes_agree(rates, size, num_hash, num_members, num_queries, num_sigmas=5):
+    '''
+    Check the rates of compare_hash_modes: the two modes agree if their
+    false positive rates differ by at most num_sigmas standard errors of
+    the difference. Each rate varies by the binomial error of num_queries
+    queries, and between filters because the fraction q of set bits does:
+    with q ~ 1 - e^(-kn/m) of binomial variance q (1 - q) / m, the rate
+    q^k moves by about k q^(k - 1) times that spread.
+    '''
+    q = 1 - math.exp(-num_hash * num_members / size)
+    expected = q ** num_hash
+    query_var = expected * (1 - expected) / num_queries
+    filter_var = (num_hash * q ** (num_hash - 1)) ** 2 * q * (1 - q) / size
+    tolerance = num_sigmas * math.sqrt(2 * (query_var + filter_var))
+    return abs(rates["independent"] - rates["double hashing"]) <= tolerance
+
+def compare_blocked(size, num_hash, members, queries):
+    '''
+    Build a plain and a blocked Bloom filter of the same size from the same
+    members, then time one lookup of every query in each and measure its
+    false positive rate over the queries that are not members.
+
+    Returns {"plain": (rate, queries per second), "blocked": (...)}.
+    '''
+    member_set = set(members)
+    results = {}
+    for name, cls in (("plain", BloomFilter), ("blocked", BlockedBloomFilter)):
+        bf = cls(size=size, num_hash=num_hash, seeds=range(num_hash))
+        bf.insert_many(members)
+        start = time.perf_counter()
+        hits = [word in bf for word in queries]
+        elapsed = time.perf_counter() - start
+        fps = sum(hit for word, hit in zip(queries, hits) if word not in member_set)
+        num_negatives = sum(word not in member_set for word in queries)
+        results[name] = (fps / num_negatives, len(queries) / elapsed)
+    return results
+
 if __name__ == '__main__':
     words = [str(i) for i in range(10000)]
 
     # Grab the command line arguments
-    start = int(sys.argv[1])
-    end = int(sys.argv[2])
-    num_hash = int(sys.argv[3])
-    bf_size = int(sys.argv[4])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("start", type=int)
+    parser.add_argument("end", type=int)
+    parser.add_argument("num_hash", type=int)
+    parser.add_argument("bf_size", type=int)
+    parser.add_argument("--double-hashing", action="store_true",
+                        help="derive the k indices from one 64-bit hash per key")
+    parser.add_argument("--compare-hash-modes", action="store_true",
+                        help="only report the false positive rate of both hashing modes, and "
+                             "exit with status 1 if they disagree (see hash_modes_agree)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="insert the members with this many processes, each filling "
+                             "its own shard filter, and OR the shards together")
+    parser.add_argument("--scalable", type=float, metavar="ERROR_RATE",
+                        help="only insert the members into a scalable Bloom filter with "
+                             "initial capacity bf_size and report its layers and false positive rate")
+    parser.add_argument("--compare-blocked", action="store_true",
+                        help="only report the false positive rate and query throughput "
+                             "of a plain and a blocked Bloom filter")
+    args = parser.parse_args()
+    start, end, num_hash, bf_size = args.start, args.end, args.num_hash, args.bf_size
+
+    if args.compare_hash_modes:
+        queries = [str(i) for i in range(10000, 110000)]
+        rates = compare_hash_modes(bf_size, num_hash, words[start:end], queries)
+        print(", ".join(f"{mode}: {rate:.5f}" for mode, rate in rates.items()))
+        if not hash_modes_agree(rates, bf_size, num_hash, len(set(words[start:end])), len(queries)):
+            sys.exit("false positive rates of the two hashing modes disagree")
+        sys.exit()
+
+    if args.scalable is not None:
+        sbf = ScalableBloomFilter(bf_size, args.scalable)
+        member_set = set(words[start:end])
+        for word in words[start:end]:
+            sbf.insert(word)
+        queries = [str(i) for i in range(10000, 110000)]
+        rate = sum(word in sbf for word in queries if word not in member_set) / len(queries)
+        print(f"layers: {sbf.num_layers}, slots: {sbf.get_size()}, "
+              f"false positive rate: {rate:.5f} (bound {sbf.expected_fp_rate():.5f})")
+        sys.exit()
+
+    if args.compare_blocked:
+        queries = [str(i) for i in range(10000, 110000)]
+        results = compare_blocked(bf_size, num_hash, words[start:end], queries)
+        for name, (rate, qps) in results.items():
+            print(f"{name}: false positive rate {rate:.5f}, {qps:,.0f} queries/s")
+        sys.exit()
 
     # Create Bloom Filter, and insert the set of words
-    bf = BloomFilter(size=bf_size, num_hash=num_hash, seeds=range(num_hash))
+    bf = BloomFilter(size=bf_size, num_hash=num_hash, seeds=range(num_hash), double_hashing=args.double_hashing)
     members = words[start:end]
     
-    bf_insertion(bf, members)
+    if args.workers > 1:
+        print(parallel_insert(bf, members, args.workers))
+    else:
+        bf_insertion(bf, members)
     print(bf.get_bit_vector())
     # print(bf.get_num_set_buckets())
 
     fp, fn = bf.compute_fp_fn(words, members)
     print(f"False Positive: {fp}, False Negative: {fn}")
-
-
-
@@ -1,14 +1,58 @@
 import xxhash
+import numpy as np
+from itertools import repeat, islice
 import subprocess
 import os
 import sys
+import mmap
+import re
+import math
+import struct
 import random
+import time
+import argparse
+
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
 
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
 
 class HashXX32(object):
     def __init__(self, seed):
+        self.seed = seed
         self.h = xxhash.xxh32(seed=seed)
 
     def hash(self, o):
@@ -16,8 +60,59 @@ class HashXX32(object):
         self.h.update(o)
         return self.h.intdigest() % sys.maxsize
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
+class HashXX64(object):
+    """
+    64-bit xxhash, used to derive all k indices of a key from one hash
+    (Kirsch-Mitzenmacher double hashing).
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.h = xxhash.xxh64(seed=seed)
+
+    def hash(self, o):
+        self.h.reset()
+        self.h.update(o)
+        return self.h.intdigest()
+
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Same as HashXX32.hash_batch, returning a uint64 matrix.
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint64)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh64_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint64, count=len(objs))
+        return hashes
+
 class CountingBloomFilter(object):
-    def __init__(self, size, num_hash, seeds):
+    # file format shared with hw2q1.BloomFilter: header, num_hash uint64
+    # seeds, zero padding to a multiple of 8 bytes, then the counters
+    # packed counter_width bits each
+    MAGIC = b"BLMF"
+    VERSION = 1
+    HEADER = "<4sHBBQI"  # magic, version, hash mode, counter width, size, num_hash
+    INDEPENDENT, DOUBLE_HASHING = 0, 1
+    # storage word of each counter width; 4-bit counters go two to a byte
+    COUNTER_DTYPES = {4: np.dtype("<u1"), 8: np.dtype("<u1"), 16: np.dtype("<u2"), 32: np.dtype("<u4")}
+
+    def __init__(self, size, num_hash, seeds, double_hashing=False, counter_width=4):
         '''
         Initialize a Counting Bloom filter.
 
@@ -25,9 +120,15 @@ class CountingBloomFilter(object):
             - size: number of slots in the Bloom filter (n)
             - num_hash: number of hash functions (k)
             - seeds: seeds to initialize hash functions
+            - double_hashing: derive all k indices from one 64-bit hash
+              seeded with seeds[0] instead of running k hash functions
+            - counter_width: bits per counter, 4, 8, 16 or 32. A counter that
+              reaches 2^counter_width - 1 saturates: it is never incremented
+              or decremented again, so removals cannot cause false negatives
 
         Raises:
-            - ValueError if the number of seeds differ with num_hash
+            - ValueError if the number of seeds differ with num_hash, or the
+              counter width is not supported
         '''
         self._size = size
         self._num_hash = num_hash
@@ -35,12 +136,122 @@ class CountingBloomFilter(object):
         # raise NotImplementedError()
         if num_hash != len(self._hashers):
             raise ValueError('Number of hash functions should equal number of seeds.')
-        self._bits = [0] * self._size
+        if counter_width not in self.COUNTER_DTYPES:
+            raise ValueError(f'Counter width should be one of {sorted(self.COUNTER_DTYPES)}.')
+        self._double_hashing = double_hashing
+        self._hasher64 = HashXX64(self._hashers[0].seed) if double_hashing else None
+        self._counter_width = counter_width
+        self._max_count = (1 << counter_width) - 1
+        # padded to whole 64-bit words like the Bloom filter bits
+        self._attach(bytearray(8 * ((size * counter_width + 63) // 64)))
+
+    def _attach(self, buffer):
+        '''
+        Use `buffer` as the packed counter storage. `self._counters` is a
+        NumPy view of it for the batched and whole-filter operations and
+        `self._cells` a memoryview of the same words, which the per-item
+        operations index with plain Python ints: gathering k counters
+        through NumPy costs more than the arithmetic it vectorizes.
+        '''
+        dtype = self.COUNTER_DTYPES[self._counter_width]
+        self._counters = np.frombuffer(buffer, dtype=dtype)
+        self._cells = memoryview(buffer).cast("B").cast(dtype.char)
+
+    def _indices(self, obj):
+        '''
+        Return the `self._num_hash` slot indices of an object: one per hash
+        function, or h1 + i * h2 + (i^3 - i) / 6 for i = 0 .. k - 1 in double
+        hashing mode, where h1 and h2 are the low and high halves of one
+        64-bit hash. The cubic term (enhanced double hashing) keeps the k
+        indices apart when h2 is a multiple of the size, where plain
+        h1 + i * h2 would put all of them on h1.
+        '''
+        if self._double_hashing:
+            hash_val = self._hasher64.hash(obj)
+            h1, h2 = hash_val & 0xFFFFFFFF, hash_val >> 32
+            return [(h1 + i * h2 + (i ** 3 - i) // 6) % self._size for i in range(self._num_hash)]
+        return [hasher.hash(obj) % self._size for hasher in self._hashers]
+
+    def _indices_many(self, objs):
+        '''
+        Return the slot indices of many objects as a (len(objs), num_hash)
+        matrix, row i equal to self._indices(objs[i]), from one hash_batch
+        call per hash function.
+        '''
+        if self._double_hashing:
+            hashes = HashXX64.hash_batch(objs, [self._hasher64.seed])
+            h1, h2 = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+            i = np.arange(self._num_hash, dtype=np.uint64)
+            return ((h1 + i * h2 + (i ** 3 - i) // 6) % np.uint64(self._size)).astype(np.int64)
+        seeds = [hasher.seed for hasher in self._hashers]
+        return (HashXX32.hash_batch(objs, seeds) % self._size).astype(np.int64)
+
+    def _get(self, indices):
+        '''Return the counters at a list of slot indices.'''
+        cells = self._cells
+        if self._counter_width == 4:
+            return [(cells[i >> 1] >> ((i & 1) << 2)) & 0xF for i in indices]
+        return [cells[i] for i in indices]
+
+    def _add(self, indices, delta):
+        '''
+        Add delta, 1 or -1, to the counter of every slot index, once per
+        occurrence, leaving counters at 0 (for -1) and saturated counters
+        untouched.
+        '''
+        cells, max_count = self._cells, self._max_count
+        if self._counter_width != 4:
+            for i in indices:
+                count = cells[i]
+                if count != max_count and count + delta >= 0:
+                    cells[i] = count + delta
+            return
+        for i in indices:
+            shift = (i & 1) << 2
+            word = cells[i >> 1]
+            count = (word >> shift) & 0xF
+            # count + delta stays within 0 .. 15, so this never carries into the other nibble
+            if count != max_count and count + delta >= 0:
+                cells[i >> 1] = word + (delta << shift)
+
+    def _get_many(self, indices):
+        '''Return the counters at an array of slot indices.'''
+        if self._counter_width == 4:
+            return (self._counters[indices >> 1] >> ((indices & 1) << 2)) & 0xF
+        return self._counters[indices]
+
+    def _add_many(self, indices, delta):
+        '''
+        Add delta to the counter of every slot index, once per occurrence,
+        clamping at 0 and leaving saturated counters untouched.
+        '''
+        slots, occurrences = np.unique(indices, return_counts=True)
+        counts = self._get_many(slots).astype(np.int64)
+        counts = np.where(counts == self._max_count, counts,
+                          np.clip(counts + delta * occurrences, 0, self._max_count))
+        if self._counter_width != 4:
+            self._counters[slots] = counts
+            return
+        # two slots can share a byte, so write the low and high nibbles apart
+        for nibble in (0, 1):
+            mask = (slots & 1) == nibble
+            positions, shift = slots[mask] >> 1, 4 * nibble
+            self._counters[positions] = (self._counters[positions] & (0xF0 >> shift)) | \
+                                        (counts[mask] << shift).astype(np.uint8)
+
+    def _values(self):
+        '''Return all `self._size` counters as one unpacked array.'''
+        if self._counter_width != 4:
+            return self._counters[:self._size]
+        values = np.empty(2 * len(self._counters), dtype=np.uint8)
+        values[0::2], values[1::2] = self._counters & 0xF, self._counters >> 4
+        return values[:self._size]
 
     def insert(self, obj) -> int:
         '''
         Insert an object into the Counting Bloom filter.
-        The object will be hashed with `self._num_hash` distinct hash functions.
+        The object will be hashed with `self._num_hash` distinct hash functions,
+        or with one 64-bit hash in double hashing mode.
 
         Inputs:
             - obj: a bytes-like object.
@@ -50,31 +261,38 @@ class CountingBloomFilter(object):
         '''
         num_collision = 0
         # raise NotImplementedError()
-        hash_results = [hasher.hash(obj) % self._size for hasher in self._hashers]
-        if all(self._bits[i] > 0 for i in hash_results):
+        hash_results = self._indices(obj)
+        if all(self._get(hash_results)):
             num_collision = 1
         else:
-            for i in hash_results:
-                self._bits[i] += 1
+            self._add(hash_results, 1)
 
         return num_collision
 
     def remove(self, obj):
         '''
         Removes an object from the Counting Bloom filter.
-        The object will be hashed with `self._num_hash` distinct hash functions.
+        The object will be hashed with `self._num_hash` distinct hash functions,
+        or with one 64-bit hash in double hashing mode.
 
         Important: All the counters should remain non-negative. If you notice a 
                    a counter would become negative, then don't subtract from it.
+                   Saturated counters are not decremented either.
 
         Inputs:
             - obj: a bytes-like object.
         '''
         # raise NotImplementedError()
-        hash_results = [hasher.hash(obj) % self._size for hasher in self._hashers]
-        for i in hash_results:
-            if self._bits[i] > 0:
-                self._bits[i] -= 1
+        self._add(self._indices(obj), -1)
+
+    def remove_many(self, objs):
+        '''
+        Remove many objects at once, with the same result as calling
+        remove on each of them: a counter only ever moves down by one per
+        removal and stops at 0, so the order of the removals does not
+        matter and all of them are applied in one array update.
+        '''
+        self._add_many(self._indices_many(objs).ravel(), -1)
 
     def __contains__(self, obj) -> bool:
         '''
@@ -87,15 +305,26 @@ class CountingBloomFilter(object):
             True if `obj` is in the filter; otherwise False.
         '''
         # raise NotImplementedError()
-        hash_results = [hasher.hash(obj) % self._size for hasher in self._hashers]
-        return all(self._bits[i] > 0 for i in hash_results)
+        return all(self._get(self._indices(obj)))
+
+    def contains_many(self, objs):
+        '''Return a boolean array, entry i telling whether objs[i] is in the filter.'''
+        return (self._get_many(self._indices_many(objs)) > 0).all(axis=1)
 
     def get_num_set_buckets(self) -> int:
         '''Return the number of set buckets in the Bloom filter.'''
-        return sum([1 for x in self._bits if x > 0])
+        return int(np.count_nonzero(self._values()))
 
     def get_bit_vector(self):
-        return ''.join([str(val) for val in self._bits])
+        return ''.join(map(str, self._values().tolist()))
+
+    def memory_bytes(self) -> int:
+        '''Return the number of bytes used by the counters.'''
+        return self._counters.nbytes
+
+    def clear(self):
+        '''Reset every counter to zero.'''
+        self._counters[:] = 0
     
     # calculate the False Positive after removal
     def get_fp(self, words, remaining_members):
@@ -105,6 +334,435 @@ class CountingBloomFilter(object):
                 fp += 1
         return fp
 
+    def to_bytes(self):
+        '''
+        Serialize to the little-endian file format: the header, the seeds,
+        padding to an 8-byte boundary, and the packed counters as they are
+        held in memory.
+        '''
+        seeds = [hasher.seed for hasher in self._hashers]
+        hash_mode = self.DOUBLE_HASHING if self._double_hashing else self.INDEPENDENT
+        header = struct.pack(self.HEADER, self.MAGIC, self.VERSION, hash_mode, self._counter_width,
+                             self._size, self._num_hash)
+        header += struct.pack(f"<{len(seeds)}Q", *seeds)
+        header += bytes(-len(header) % 8)
+        return header + self._counters.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        '''
+        Rebuild a filter written by to_bytes. The counters are views into
+        `buffer`, so nothing but the header is parsed or copied; the filter
+        is read-only if the buffer is.
+        '''
+        magic, version, hash_mode, counter_width, size, num_hash = struct.unpack_from(cls.HEADER, buffer, 0)
+        if magic != cls.MAGIC or version != cls.VERSION or counter_width not in cls.COUNTER_DTYPES:
+            raise ValueError("Not a counting Bloom filter file")
+        offset = struct.calcsize(cls.HEADER)
+        seeds = struct.unpack_from(f"<{num_hash}Q", buffer, offset)
+        offset += 8 * num_hash
+        offset += -offset % 8
+        cbf = cls.__new__(cls)
+        cbf._size = size
+        cbf._num_hash = num_hash
+        cbf._hashers = [HashXX32(seed) for seed in seeds]
+        cbf._double_hashing = hash_mode == cls.DOUBLE_HASHING
+        cbf._hasher64 = HashXX64(seeds[0]) if cbf._double_hashing else None
+        cbf._counter_width = counter_width
+        cbf._max_count = (1 << counter_width) - 1
+        cbf._attach(memoryview(buffer)[offset:offset + 8 * ((size * counter_width + 63) // 64)])
+        return cbf
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path, writable=False):
+        '''
+        Memory-map a file written by save and answer queries from the
+        mapping. With writable, updates go to a private copy-on-write
+        mapping and never reach the file.
+        '''
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+        return cls.from_bytes(mm)
+
+class WindowedCountingBloomFilter(object):
+    """
+    Membership over the last `window` items of a stream. The stream is
+    split over a ring of `generations` counting Bloom filters that each
+    take g = ceil(window / (generations - 1)) consecutive items; when the
+    newest one is full, the oldest is cleared and reused. The generations
+    - 1 older sub-filters alone always cover the last `window` pushes, so
+    an item is reported present for at least `window` pushes after it was
+    pushed (no false negatives) and expires within generations * g pushes.
+
+    Memory is constant. Clearing a sub-filter zeroes all its counters, so
+    the work per push is constant only amortized over the g pushes of a
+    generation.
+    """
+    def __init__(self, window, size, num_hash, seeds, generations=4, double_hashing=False, counter_width=4):
+        '''
+        Initialize a windowed counting Bloom filter.
+
+        Inputs:
+            - window: number of most recent items to remember
+            - size, num_hash, seeds, double_hashing, counter_width: parameters
+              of every generation, see CountingBloomFilter
+            - generations: number of sub-filters in the ring, at least 2
+
+        Raises:
+            - ValueError if there are fewer than 2 generations or the window is empty
+        '''
+        if generations < 2 or window < 1:
+            raise ValueError('Window should be positive and split over at least 2 generations.')
+        seeds = list(seeds)
+        self._window = window
+        self._generation_items = math.ceil(window / (generations - 1))
+        self._generations = [CountingBloomFilter(size, num_hash, seeds, double_hashing=double_hashing,
+                                                 counter_width=counter_width)
+                             for _ in range(generations)]
+        self._current = 0
+        self._current_items = 0
+
+    def push(self, obj) -> int:
+        '''
+        Add the newest item of the stream, expiring the oldest generation
+        first if the current one is full.
+
+        Returns:
+            - num_collision: as CountingBloomFilter.insert
+        '''
+        if self._current_items == self._generation_items:
+            self._current = (self._current + 1) % len(self._generations)
+            self._generations[self._current].clear()
+            self._current_items = 0
+        self._current_items += 1
+        return self._generations[self._current].insert(obj)
+
+    def __contains__(self, obj) -> bool:
+        return any(obj in generation for generation in self._generations)
+
+    def clear(self):
+        for generation in self._generations:
+            generation.clear()
+        self._current = 0
+        self._current_items = 0
+
+    def memory_bytes(self) -> int:
+        return sum(generation.memory_bytes() for generation in self._generations)
+
+
+class CuckooFilter(object):
+    """
+    Cuckoo filter (Fan et al., 2014): every item is stored as a small
+    fingerprint in one of two buckets, i1 = h(x) and i2 = i1 ^ h(fp), so
+    the other bucket of a stored fingerprint can always be recomputed from
+    the fingerprint alone. Items can be removed exactly, and removing one
+    that was never inserted only ever touches a matching fingerprint.
+    """
+    def __init__(self, capacity, fingerprint_bits=8, bucket_size=4, max_kicks=500, seed=0):
+        '''
+        Initialize a cuckoo filter.
+
+        Inputs:
+            - capacity: number of items the filter should hold; the number
+              of buckets is the next power of two of capacity / bucket_size
+            - fingerprint_bits: bits per stored fingerprint, 1 to 32
+            - bucket_size: fingerprints per bucket
+            - max_kicks: evictions tried before an insert gives up
+            - seed: seed of the item hash; the fingerprint and fingerprint
+              hashes use seed + 1 and seed + 2
+
+        Raises:
+            - ValueError if a parameter is out of range
+        '''
+        if not 1 <= fingerprint_bits <= 32:
+            raise ValueError('Fingerprint bits should be between 1 and 32.')
+        if capacity < 1 or bucket_size < 1:
+            raise ValueError('Capacity and bucket size should be positive.')
+        num_buckets = 1
+        while num_buckets * bucket_size < capacity:
+            num_buckets *= 2
+        self._num_buckets = num_buckets
+        self._bucket_size = bucket_size
+        self._fingerprint_bits = fingerprint_bits
+        self._max_kicks = max_kicks
+        self._index_hasher = HashXX32(seed)
+        self._fingerprint_hasher = HashXX32(seed + 1)
+        self._alt_hasher = HashXX32(seed + 2)
+        dtype = np.uint8 if fingerprint_bits <= 8 else np.uint16 if fingerprint_bits <= 16 else np.uint32
+        # fingerprint 0 marks an empty slot
+        self._buckets = np.zeros((num_buckets, bucket_size), dtype=dtype)
+        self._num_items = 0
+        # an item left homeless by a failed insert; the filter is full while set
+        self._victim = None
+        self._rng = random.Random(seed)
+
+    def _fingerprint_and_index(self, obj):
+        fingerprint = self._fingerprint_hasher.hash(obj) % ((1 << self._fingerprint_bits) - 1) + 1
+        return fingerprint, self._index_hasher.hash(obj) & (self._num_buckets - 1)
+
+    def _alt_index(self, index, fingerprint):
+        return index ^ (self._alt_hasher.hash(fingerprint.to_bytes(4, "little")) & (self._num_buckets - 1))
+
+    def _put(self, index, fingerprint) -> bool:
+        empty = np.flatnonzero(self._buckets[index] == 0)
+        if len(empty) == 0:
+            return False
+        self._buckets[index, empty[0]] = fingerprint
+        return True
+
+    def _relocate(self, index, fingerprint):
+        '''
+        Store a fingerprint in bucket `index`, kicking a random resident to
+        its other bucket while the bucket is full. After max_kicks the last
+        homeless fingerprint becomes the victim.
+        '''
+        for _ in range(self._max_kicks):
+            if self._put(index, fingerprint):
+                return
+            slot = self._rng.randrange(self._bucket_size)
+            fingerprint, self._buckets[index, slot] = int(self._buckets[index, slot]), fingerprint
+            index = self._alt_index(index, fingerprint)
+        self._victim = (index, fingerprint)
+
+    def insert(self, obj) -> bool:
+        '''
+        Insert an object, evicting stored fingerprints to their other bucket
+        up to max_kicks times if both of its buckets are full.
+
+        Returns:
+            False if the filter is full and the object was not inserted.
+        '''
+        if self._victim is not None:
+            return False
+        fingerprint, index = self._fingerprint_and_index(obj)
+        self._num_items += 1
+        alt_index = self._alt_index(index, fingerprint)
+        if not self._put(index, fingerprint) and not self._put(alt_index, fingerprint):
+            self._relocate(self._rng.choice((index, alt_index)), fingerprint)
+        return True
+
+    def remove(self, obj) -> bool:
+        '''
+        Remove one copy of an object's fingerprint.
+
+        Returns:
+            True if a matching fingerprint was found and removed.
+        '''
+        fingerprint, index = self._fingerprint_and_index(obj)
+        alt_index = self._alt_index(index, fingerprint)
+        for i in (index, alt_index):
+            match = np.flatnonzero(self._buckets[i] == fingerprint)
+            if len(match):
+                self._buckets[i, match[0]] = 0
+                self._num_items -= 1
+                if self._victim is not None:
+                    # there is room again: re-home the victim
+                    victim_index, victim = self._victim
+                    self._victim = None
+                    self._relocate(victim_index, victim)
+                return True
+        if self._victim is not None and self._victim[1] == fingerprint and \
+                self._victim[0] in (index, alt_index):
+            self._victim = None
+            self._num_items -= 1
+            return True
+        return False
+
+    def __contains__(self, obj) -> bool:
+        fingerprint, index = self._fingerprint_and_index(obj)
+        alt_index = self._alt_index(index, fingerprint)
+        if self._victim is not None and self._victim[1] == fingerprint and \
+                self._victim[0] in (index, alt_index):
+            return True
+        return bool((self._buckets[index] == fingerprint).any() or
+                    (self._buckets[alt_index] == fingerprint).any())
+
+    def __len__(self) -> int:
+        return self._num_items
+
+    def load_factor(self) -> float:
+        return self._num_items / self._buckets.size
+
+    def memory_bytes(self) -> int:
+        '''Return the number of bytes used by the buckets.'''
+        return self._buckets.nbytes
+
+
+class FrequencySketch(object):
+    """
+    Base of the frequency sketches: a depth x width matrix of int64
+    counters where row i is indexed by a hash function seeded with
+    seeds[i], like the k hash functions of CountingBloomFilter.
+    """
+    def __init__(self, width, depth, seeds):
+        '''
+        Inputs:
+            - width: counters per row
+            - depth: number of rows (hash functions)
+            - seeds: seeds to initialize the hash functions, one per row
+
+        Raises:
+            - ValueError if the number of seeds differ with depth
+        '''
+        seeds = list(seeds)
+        if depth != len(seeds):
+            raise ValueError('Number of hash functions should equal number of seeds.')
+        self._width = width
+        self._depth = depth
+        self._seeds = seeds
+        self._counters = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def merge(self, other):
+        '''
+        Add the counts of another sketch of the same kind and shape, as if
+        its stream had been fed to this one.
+
+        Raises:
+            - ValueError if the sketches differ in kind, shape or seeds
+        '''
+        if type(self) is not type(other) or (self._width, self._seeds) != (other._width, other._seeds):
+            raise ValueError('Sketches should have the same type, width and seeds.')
+        self._counters += other._counters
+
+    def memory_bytes(self) -> int:
+        '''Return the number of bytes used by the counters.'''
+        return self._counters.nbytes
+
+
+class CountMinSketch(FrequencySketch):
+    """
+    Count-Min sketch (Cormode and Muthukrishnan): every update adds to one
+    counter per row and the estimate is the smallest of them, which never
+    underestimates a count. In conservative update mode only the counters
+    below the new lower bound are raised, which lowers the overestimate
+    but requires non-negative updates.
+    """
+    def __init__(self, width, depth, seeds, conservative=False):
+        super().__init__(width, depth, seeds)
+        self._hashers = [HashXX32(seed) for seed in self._seeds]
+        self._conservative = conservative
+
+    def _columns(self, obj):
+        return [hasher.hash(obj) % self._width for hasher in self._hashers]
+
+    def update(self, obj, count=1):
+        '''
+        Add `count` occurrences of an object.
+
+        Raises:
+            - ValueError on a negative count in conservative update mode
+        '''
+        columns = self._columns(obj)
+        if not self._conservative:
+            self._counters[self._rows, columns] += count
+            return
+        if count < 0:
+            raise ValueError('Conservative update needs non-negative counts.')
+        cells = self._counters[self._rows, columns]
+        self._counters[self._rows, columns] = np.maximum(cells, cells.min() + count)
+
+    def update_many(self, objs):
+        '''
+        Add one occurrence of every object in a batch, hashing the batch at
+        once; conservative updates are applied one object at a time.
+        '''
+        if self._conservative:
+            for obj in objs:
+                self.update(obj)
+            return
+        columns = HashXX32.hash_batch(objs, self._seeds) % self._width
+        for row in range(self._depth):
+            self._counters[row] += np.bincount(columns[:, row], minlength=self._width)
+
+    def estimate(self, obj) -> int:
+        '''Return an upper bound on the count of an object.'''
+        return int(self._counters[self._rows, self._columns(obj)].min())
+
+
+class CountSketch(FrequencySketch):
+    """
+    Count sketch (Charikar, Chen and Farach-Colton): every row also hashes
+    an object to a sign and adds +count or -count, and the estimate is the
+    median of the signed counters. It is unbiased, and its error depends
+    on the second moment of the stream rather than on its total count.
+    Row i uses one HashXX64 seeded with seeds[i]: the low 32 bits give the
+    column and bit 32 the sign.
+    """
+    def __init__(self, width, depth, seeds):
+        super().__init__(width, depth, seeds)
+        self._hashers = [HashXX64(seed) for seed in self._seeds]
+
+    def _columns_and_signs(self, obj):
+        hashes = [hasher.hash(obj) for hasher in self._hashers]
+        columns = [(hash_val & 0xFFFFFFFF) % self._width for hash_val in hashes]
+        signs = np.array([1 - 2 * ((hash_val >> 32) & 1) for hash_val in hashes])
+        return columns, signs
+
+    def update(self, obj, count=1):
+        '''Add `count` occurrences of an object; count may be negative.'''
+        columns, signs = self._columns_and_signs(obj)
+        self._counters[self._rows, columns] += signs * count
+
+    def update_many(self, objs):
+        '''Add one occurrence of every object in a batch, hashing the batch at once.'''
+        hashes = HashXX64.hash_batch(objs, self._seeds)
+        columns = ((hashes & 0xFFFFFFFF) % self._width).astype(np.int64)
+        signs = 1 - 2 * ((hashes >> 32) & 1).astype(np.int64)
+        for row in range(self._depth):
+            self._counters[row] += np.bincount(columns[:, row], weights=signs[:, row],
+                                               minlength=self._width).astype(np.int64)
+
+    def estimate(self, obj) -> int:
+        '''Return the median estimate of the count of an object.'''
+        columns, signs = self._columns_and_signs(obj)
+        return int(np.median(self._counters[self._rows, columns] * signs))
+
+
+class HeavyHitters(object):
+    """
+    Track the k most frequent objects of a stream in a frequency sketch:
+    after every update the object's estimate is compared with the weakest
+    of the current top k, which it replaces if larger. Memory is the sketch
+    plus k candidates, however many distinct objects the stream has.
+    """
+    def __init__(self, k, sketch):
+        self._k = k
+        self._sketch = sketch
+        self._top = {}
+
+    def update(self, obj, count=1):
+        self._sketch.update(obj, count)
+        estimate = self._sketch.estimate(obj)
+        if obj in self._top or len(self._top) < self._k:
+            self._top[obj] = estimate
+            return
+        weakest = min(self._top, key=self._top.get)
+        if estimate > self._top[weakest]:
+            del self._top[weakest]
+            self._top[obj] = estimate
+
+    def top(self):
+        '''Return the tracked (object, estimated count) pairs, most frequent first.'''
+        return sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+
+
+def heavy_hitters(words, k, width, depth, seeds=None, conservative=True):
+    '''
+    Return the top-k (word, estimated count) pairs of a stream of words,
+    e.g. iter_words(filename), counted in a Count-Min sketch.
+    '''
+    seeds = range(depth) if seeds is None else seeds
+    tracker = HeavyHitters(k, CountMinSketch(width, depth, seeds, conservative=conservative))
+    for word in words:
+        tracker.update(word)
+    return tracker.top()
+
+
 def cbf_insertion(cbf, members):
     """ Inserts each member provided into the Counting Bloom Filter """
     num_collision = 0
@@ -113,21 +771,102 @@ def cbf_insertion(cbf, members):
 
 def cbf_removal(cbf, words):
     """ Try to remove all the words from words """
-    for word in words:
-        cbf.remove(word)
+    cbf.remove_many(words)
+
+def compare_cuckoo(cbf, cf, members, queries):
+    '''
+    Insert the members into a counting Bloom filter and a cuckoo filter,
+    query every query, then remove the members again, timing each phase.
+
+    Returns {name: {"bits/item", "insert/s", "query/s", "remove/s",
+    "fp rate"}}, where bits/item is measured with all members inserted and
+    the false positive rate is over the queries that are not members.
+    '''
+    member_set = set(members)
+    non_members = [word for word in queries if word not in member_set]
+    results = {}
+    for name, flt in (("counting bloom", cbf), ("cuckoo", cf)):
+        start = time.perf_counter()
+        for word in members:
+            flt.insert(word)
+        insert_time = time.perf_counter() - start
+        start = time.perf_counter()
+        fps = sum(word in flt for word in non_members)
+        query_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for word in members:
+            flt.remove(word)
+        remove_time = time.perf_counter() - start
+        results[name] = {"bits/item": 8 * flt.memory_bytes() / len(members),
+                         "insert/s": len(members) / insert_time,
+                         "query/s": len(non_members) / query_time,
+                         "remove/s": len(members) / remove_time,
+                         "fp rate": fps / len(non_members)}
+    return results
 
 if __name__ == "__main__":
     all_words = [str(i) for i in range(10000)]
 
     # Grab the command line arguments
-    start = int(sys.argv[1])
-    end = int(sys.argv[2])
-    num_hash =int(sys.argv[3])
-    bf_size = int(sys.argv[4])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("start", type=int)
+    parser.add_argument("end", type=int)
+    parser.add_argument("num_hash", type=int)
+    parser.add_argument("bf_size", type=int)
+    parser.add_argument("--double-hashing", action="store_true",
+                        help="derive the k indices from one 64-bit hash per key")
+    parser.add_argument("--counter-width", type=int, default=4, choices=[4, 8, 16, 32],
+                        help="bits per counter; full counters saturate and are never decremented")
+    parser.add_argument("--window", type=int,
+                        help="only push the members through a windowed filter remembering the last "
+                             "WINDOW of them and report which are still found")
+    parser.add_argument("--generations", type=int, default=4,
+                        help="sub-filters of the windowed filter, at least 2, with --window")
+    parser.add_argument("--heavy-hitters", metavar="FILE",
+                        help="only print the most frequent words of FILE, counted in a Count-Min "
+                             "sketch of num_hash rows of bf_size counters")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of heavy hitters to print, with --heavy-hitters")
+    parser.add_argument("--compare-cuckoo", action="store_true",
+                        help="only benchmark the counting Bloom filter against a cuckoo filter "
+                             "holding the same members")
+    parser.add_argument("--fingerprint-bits", type=int, default=8,
+                        help="cuckoo filter fingerprint size, with --compare-cuckoo")
+    parser.add_argument("--bucket-size", type=int, default=4,
+                        help="cuckoo filter bucket size, with --compare-cuckoo")
+    args = parser.parse_args()
+    start, end, num_hash, bf_size = args.start, args.end, args.num_hash, args.bf_size
     
+    if args.heavy_hitters:
+        for word, count in heavy_hitters(iter_words(args.heavy_hitters), args.top, bf_size, num_hash):
+            print(f"{word.decode('utf8', 'ignore')}\t{count}")
+        sys.exit()
+
     # Create CBF, and insert your members into it
-    cbf = CountingBloomFilter(size=bf_size, num_hash=num_hash, seeds=range(num_hash))
+    cbf = CountingBloomFilter(size=bf_size, num_hash=num_hash, seeds=range(num_hash), double_hashing=args.double_hashing,
+                              counter_width=args.counter_width)
     members = all_words[start:end]
+
+    if args.window:
+        wcbf = WindowedCountingBloomFilter(args.window, bf_size, num_hash, range(num_hash),
+                                           generations=args.generations, double_hashing=args.double_hashing,
+                                           counter_width=args.counter_width)
+        for word in members:
+            wcbf.push(word)
+        recent, expired = members[-args.window:], members[:-args.window]
+        print(f"recent found: {sum(word in wcbf for word in recent)}/{len(recent)}, "
+              f"expired found: {sum(word in wcbf for word in expired)}/{len(expired)}, "
+              f"never pushed found: {sum(word in wcbf for word in all_words if word not in members)}")
+        sys.exit()
+
+    if args.compare_cuckoo:
+        cf = CuckooFilter(len(members), fingerprint_bits=args.fingerprint_bits, bucket_size=args.bucket_size)
+        queries = [str(i) for i in range(10000, 60000)]
+        for name, stats in compare_cuckoo(cbf, cf, members, queries).items():
+            print(f"{name}: {stats['bits/item']:.2f} bits/item, {stats['insert/s']:,.0f} inserts/s, "
+                  f"{stats['query/s']:,.0f} queries/s, {stats['remove/s']:,.0f} removes/s, "
+                  f"false positive rate {stats['fp rate']:.5f}")
+        sys.exit()
     
     cbf_insertion(cbf, members)
     print(cbf.get_bit_vector())
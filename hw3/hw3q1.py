@@ -1,14 +1,57 @@
 import xxhash
-import sys
+import numpy as np
+from itertools import repeat, islice
+import os
+import mmap
+import re
+import math
+import struct
+import argparse
+
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
 
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
 
 class HashXX32(object):
     """
     HashXX32 class: Used to draw hash functions
     """
     def __init__(self, seed):
+        self.seed = seed
         self.h = xxhash.xxh32(seed=seed)
 
     def hash(self, o):
@@ -16,6 +59,21 @@ class HashXX32(object):
         self.h.update(o)
         return self.h.intdigest() % (2**32) 
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
 class MinHash_KHash(object):
     """
     MinHash_KHash data structure.
@@ -40,7 +98,8 @@ class MinHash_KHash(object):
         self._numhashers = num_hashers
         self._hashers = [HashXX32(start_seed+i) for i in range(self._numhashers)]
         self._hashrange = 2**32
-        self._minhashes = [self._hashrange for i in range(self._numhashers)]
+        # uint32 cannot hold 2**32, so an empty sketch starts at the largest hash value
+        self._minhashes = np.full(self._numhashers, self._hashrange - 1, dtype=np.uint32)
 
     def update_sketch(self, obj):
         """
@@ -49,17 +108,26 @@ class MinHash_KHash(object):
         hash value seen so far from that hash function. If so, replace 
         that value with the new minimum.
         """
-        
-        for i in range(self._numhashers):
-            hash_val = self._hashers[i].hash(obj)
-            if hash_val < self._minhashes[i]:
-                self._minhashes[i] = hash_val
+        self.update_many([obj])
+
+    def update_many(self, objs):
+        """
+        Update the sketch with a batch of objects: hash the whole batch with
+        all k hash functions at once, and fold the column-wise minimum of
+        the (len(objs), k) hash matrix into the minimum hashes. Repeated
+        objects cannot change a minimum, so each distinct one is hashed once.
+        """
+        objs = list(set(objs))
+        if len(objs) == 0:
+            return
+        hashes = HashXX32.hash_batch(objs, [hasher.seed for hasher in self._hashers])
+        np.minimum(self._minhashes, hashes.min(axis=0), out=self._minhashes)
     
     def get_sketch(self):
         """
         Return the MinHash_KHash sketch - minimum hashes for each hash function
         """
-        return self._minhashes
+        return self._minhashes.tolist()
     
     def estimate_cardinality(self):
         """
@@ -70,7 +138,8 @@ class MinHash_KHash(object):
         M_avg = hash_range/(N + 1)
 
         """
-        M_avg = sum(self._minhashes)/len(self._minhashes)
+        # summed in uint64, as k uint32 values can overflow a uint32 sum
+        M_avg = int(self._minhashes.sum(dtype=np.uint64))/len(self._minhashes)
         
         return self._hashrange / M_avg - 1
     
@@ -94,12 +163,7 @@ class MinHash_KHash(object):
         union_sketch = MinHash_KHash(self._numhashers, 0)
         union_sketch._hashers = self._hashers
 
-        union_minhash = [] 
-
-        union_sketch._minhashes = union_minhash
-
-        for i in range(self._numhashers):
-            union_sketch._minhashes.append(min(self.get_sketch()[i], b_minhash.get_sketch()[i]))
+        union_sketch._minhashes = np.minimum(self._minhashes, b_minhash._minhashes)
 
         return union_sketch
         
@@ -154,22 +218,125 @@ class MinHash_KHash(object):
         """
         return self.compute_intersection(b_minhash) / self.estimate_cardinality()
 
+class MinHash_OnePermutation(MinHash_KHash):
+    """
+    One permutation MinHash (Li, Owen and Zhang, 2012) with densification.
+
+    Every object is hashed once. The hash range is split into k equal
+    bins; the bin of hash value h is h * k >> 32, and its position inside
+    the bin, scaled back to the whole range, is h * k mod 2**32. Each bin
+    keeps the minimum position it has seen, so sketching costs O(1) per
+    object instead of O(k).
+
+    Bins that saw no object are filled by optimal densification
+    (Shrivastava, 2017): empty bin j copies the bin chosen by hashing
+    (j, attempt) for attempt = 0, 1, ... until a non-empty one is hit.
+    Sketches with the same seed densify the same way, so their densified
+    sketches stay comparable.
+    """
+
+    def __init__(self, num_hashers, start_seed):
+        """
+        Same attributes as MinHash_KHash, except that self._hashers holds
+        the single hash function and self._minhashes the per-bin minimums
+        before densification. self._empty marks the bins no object has
+        reached yet; every value, including 2**32 - 1, is a valid position,
+        so emptiness cannot be told from the minimums alone.
+        """
+        self._numhashers = num_hashers
+        self._hashers = [HashXX32(start_seed)]
+        self._hashrange = 2**32
+        self._minhashes = np.full(self._numhashers, self._hashrange - 1, dtype=np.uint32)
+        self._empty = np.ones(self._numhashers, dtype=bool)
+
+    def update_many(self, objs):
+        """
+        Hash every distinct object of the batch once and fold its position
+        into the minimum of its bin.
+        """
+        objs = list(set(objs))
+        if len(objs) == 0:
+            return
+        products = HashXX32.hash_batch(objs, [self._hashers[0].seed])[:, 0].astype(np.uint64) * self._numhashers
+        bins = (products >> 32).astype(np.intp)
+        np.minimum.at(self._minhashes, bins, (products & 0xFFFFFFFF).astype(np.uint32))
+        self._empty[bins] = False
+
+    def get_sketch(self):
+        """
+        Return the densified sketch: the minimum of every bin, with each
+        empty bin filled from a non-empty one.
+        """
+        sketch = self._minhashes.copy()
+        empty = self._empty
+        if empty.all():
+            return sketch.tolist()
+        for j in np.flatnonzero(empty):
+            attempt = 0
+            while True:
+                donor = self._hashers[0].hash(struct.pack("<II", j, attempt)) % self._numhashers
+                if not empty[donor]:
+                    break
+                attempt += 1
+            sketch[j] = self._minhashes[donor]
+        return sketch.tolist()
+
+    def estimate_cardinality(self):
+        """
+        Each bin holds a Poisson(lam) number c of objects, lam = N / k, and
+        the minimum of c positions is hash_range / (c + 1) on average.
+        Counting an empty bin as hash_range (c = 0), the mean bin value
+        over hash_range is then (1 - e^-lam) / lam in expectation, whether
+        or not bins are empty, so one estimator covers small and large N.
+        The mean decreases from 1 to 0 as lam grows; it is solved for lam
+        by bisection and N = k lam is returned.
+        """
+        mean = np.where(self._empty, 1.0, self._minhashes / self._hashrange).mean()
+        expected_mean = lambda lam: (1 - math.exp(-lam)) / lam if lam else 1.0
+        low, high = 0.0, 1.0
+        while expected_mean(high) > mean:
+            low, high = high, 2 * high
+        for _ in range(64):
+            mid = (low + high) / 2
+            if expected_mean(mid) > mean:
+                low = mid
+            else:
+                high = mid
+
+        return self._numhashers * (low + high) / 2
+
+    def union(self, b_minhash):
+        """
+        Finds the union sketch of self and b_minhash: the bin-wise minimum
+        of the two sketches before densification.
+        """
+        union_sketch = MinHash_OnePermutation(self._numhashers, 0)
+        union_sketch._hashers = self._hashers
+        union_sketch._minhashes = np.minimum(self._minhashes, b_minhash._minhashes)
+        union_sketch._empty = self._empty & b_minhash._empty
+
+        return union_sketch
+
 if __name__ == '__main__':
     # Grab the command-line arguments
-    num_hash = int(sys.argv[1])
-    fn_a = sys.argv[2]
-    fn_b = sys.argv[3]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("num_hash", type=int)
+    parser.add_argument("fn_a")
+    parser.add_argument("fn_b")
+    parser.add_argument("--oph", action="store_true",
+                        help="use one permutation MinHash with num_hash bins instead of num_hash hash functions")
+    args = parser.parse_args()
+    num_hash, fn_a, fn_b = args.num_hash, args.fn_a, args.fn_b
 
     # Construct the MinHash sketches
-    mh_a = MinHash_KHash(num_hash, 0)
-    mh_b = MinHash_KHash(num_hash, 0)
-    data_a = get_words(fn_a)
-    data_b = get_words(fn_b)
-
-    for x in data_a:
-        mh_a.update_sketch(x)
-    for x in data_b:
-        mh_b.update_sketch(x)
+    sketch_type = MinHash_OnePermutation if args.oph else MinHash_KHash
+    mh_a = sketch_type(num_hash, 0)
+    mh_b = sketch_type(num_hash, 0)
+
+    for batch in iter_words(fn_a, batch_size=4096):
+        mh_a.update_many(batch)
+    for batch in iter_words(fn_b, batch_size=4096):
+        mh_b.update_many(batch)
     
     est_card_a = mh_a.estimate_cardinality()
     est_card_b = mh_b.estimate_cardinality()
@@ -1,14 +1,55 @@
 import xxhash
+import numpy as np
+from itertools import repeat, islice
 import sys
+import os
+import mmap
+import re
+
+def iter_words(filename, batch_size=None):
+    '''
+    Stream the whitespace-separated tokens of a file as UTF-8 bytes. The
+    file is memory-mapped and scanned in place, so it is never read or
+    decoded as a whole.
+
+    The scan splits on ASCII whitespace and the 0x1c-0x1f separators.
+    That alone would differ from decode("utf8", "ignore").split() on
+    non-ASCII whitespace such as U+00A0, U+2003 or U+3000, so tokens with
+    non-ASCII bytes are decoded (dropping invalid UTF-8) and split again
+    with str.split(). The tokens are then exactly the UTF-8 encoding of
+    what get_words returns.
+
+    With batch_size, yield lists of up to batch_size tokens instead.
+    '''
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # the mapping outlives the file object and is released with the generator
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tokens = (word for match in re.finditer(rb"[^\s\x1c-\x1f]+", mm) for word in _resplit(match.group()))
+    if batch_size is None:
+        yield from tokens
+    else:
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def _resplit(token):
+    if token.isascii():
+        return (token,)
+    return [word.encode("utf8") for word in token.decode("utf8", "ignore").split()]
 
 def get_words(filename):
-    return open(filename, "rb").read().decode("utf8", "ignore").strip().split()
+    return [word.decode("utf8", "ignore") for word in iter_words(filename)]
 
 class HashXX32(object):
     """
     HashXX32 class: Used to draw hash functions
     """
     def __init__(self, seed):
+        self.seed = seed
         self.h = xxhash.xxh32(seed=seed)
 
     def hash(self, o):
@@ -16,6 +57,21 @@ class HashXX32(object):
         self.h.update(o)
         return self.h.intdigest() % (2**32)
 
+    @staticmethod
+    def hash_batch(objs, seeds):
+        '''
+        Hash every object in `objs` with every seed in `seeds` in one call.
+
+        Returns a (len(objs), len(seeds)) uint32 matrix whose entry [i, j]
+        is bit for bit equal to HashXX32(seeds[j]).hash(objs[i]).
+        '''
+        objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        hashes = np.empty((len(objs), len(seeds)), dtype=np.uint32)
+        for j, seed in enumerate(seeds):
+            hashes[:, j] = np.fromiter(map(xxhash.xxh32_intdigest, objs, repeat(seed, len(objs))),
+                                       dtype=np.uint32, count=len(objs))
+        return hashes
+
 class MinHash_BottomK(object):
     """
     MinHash_BottomK data structure.
@@ -168,12 +224,10 @@ if __name__ == "__main__":
     # Construct the MinHash sketches
     mh_a = MinHash_BottomK(k, 0)
     mh_b = MinHash_BottomK(k, 0)
-    data_a = get_words(fn_a)
-    data_b = get_words(fn_b)
 
-    for x in data_a:
+    for x in iter_words(fn_a):
         mh_a.update_sketch(x)
-    for x in data_b:
+    for x in iter_words(fn_b):
         mh_b.update_sketch(x)
 
     est_card_a = mh_a.estimate_cardinality()